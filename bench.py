@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Benchmarks of the window's own code paths on synthetic CSVs: import
+# (parsed and from the parse cache), export, delete and undo of a large
+# range, copy and paste, selection statistics and repainting while
+# scrolling. Runs headless on Qt's offscreen platform. Results are written
+# as JSON and compared against a stored baseline, so a slowdown shows up as
+# a failed run:
+#
+#   python bench.py --sizes 10k,100k --output results.json
+#   python bench.py --update-baseline        # after an intended change
+#
+# Generated files are kept in --data-dir and reused; the same name and size
+# always give the same bytes.
+
+SEED = 20240101
+WORDS = np.array(['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'Berlin', 'Paris', 'Lisbon', 'Oslo', 'Quito',
+                  'red', 'green', 'blue', 'amber', 'north', 'south', 'east', 'west', 'open', 'closed'], dtype=object)
+DATASETS = ('narrow-numeric', 'wide-numeric', 'narrow-text', 'wide-text', 'quoted')
+CASES = ('import', 'import_cached', 'export', 'delete', 'undo', 'copy', 'paste', 'stats', 'repaint')
+WIDE_COLUMNS = 40
+GENERATE_ROWS = 100000
+REPAINT_FRAMES = 50
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+def parse_size(text):
+    # 10k, 2.5m or a plain row count
+    text = text.strip().lower()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1:], 1)
+    try:
+        return int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        raise ValueError(f'Not a row count: {text!r}')
+
+
+def size_label(rows):
+    for scale, suffix in ((10 ** 6, 'm'), (10 ** 3, 'k')):
+        if rows >= scale and rows % scale == 0:
+            return f'{rows // scale}{suffix}'
+    return str(rows)
+
+
+def words(rng, n, per_cell=1):
+    texts = WORDS[rng.integers(0, len(WORDS), n)]
+    for _ in range(per_cell - 1):
+        texts = texts + ' ' + WORDS[rng.integers(0, len(WORDS), n)]
+    return texts
+
+
+def dataset_frame(name, rng, start, n):
+    # Rows [start, start + n) of a dataset as a DataFrame
+    ids = np.arange(start, start + n)
+    if name == 'narrow-numeric':
+        return pd.DataFrame({'id': ids, 'price': np.round(rng.random(n) * 1000, 2),
+                             'ratio': rng.standard_normal(n), 'qty': rng.integers(0, 500, n)})
+    if name == 'wide-numeric':
+        return pd.DataFrame({f'v{col}': np.round(rng.standard_normal(n) * 100, 3) for col in range(WIDE_COLUMNS)})
+    if name == 'narrow-text':
+        return pd.DataFrame({'id': ids, 'city': words(rng, n), 'tag': words(rng, n, 2), 'note': words(rng, n, 5)})
+    if name == 'wide-text':
+        return pd.DataFrame({f't{col}': words(rng, n, 1 + col % 3) for col in range(WIDE_COLUMNS)})
+    if name == 'quoted':
+        # Delimiters, doubled quotes and line breaks inside quoted fields
+        quoted = words(rng, n) + ', "' + words(rng, n) + '"'
+        multiline = np.where(rng.random(n) < 0.2, words(rng, n) + '\n' + words(rng, n, 3), words(rng, n, 2))
+        return pd.DataFrame({'id': ids, 'quoted': quoted, 'multiline': multiline, 'amount': np.round(rng.random(n) * 100, 2)})
+    raise ValueError(f'Unknown dataset {name!r}, use one of {", ".join(DATASETS)}')
+
+
+def generate(directory, name, rows):
+    # Path of the dataset's CSV, written on first use
+    path = os.path.join(directory, f'{name}-{size_label(rows)}.csv')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.part', 'w', newline='', encoding='utf-8') as file:
+        for block, start in enumerate(range(0, rows, GENERATE_ROWS)):
+            rng = np.random.default_rng([SEED, DATASETS.index(name), rows, block])
+            frame = dataset_frame(name, rng, start, min(GENERATE_ROWS, rows - start))
+            frame.to_csv(file, header=not start, index=False, lineterminator='\n')
+    os.replace(path + '.part', path)
+    return path
+
+
+class Bench:
+    # Drives one App window through the cases and times them
+    def __init__(self, app, window, path, cases, repeat):
+        self.app = app
+        self.window = window
+        self.path = path
+        self.cases = cases
+        self.repeat = repeat
+
+    def wait(self, busy, timeout=3600):
+        deadline = time.perf_counter() + timeout
+        while busy():
+            self.app.processEvents()
+            if time.perf_counter() > deadline:
+                raise TimeoutError('Benchmark step did not finish')
+            time.sleep(0.0005)
+
+    def timed(self, step, setup=None):
+        # Best of `repeat` runs, in seconds
+        best = float('inf')
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            self.app.processEvents()
+            start = time.perf_counter()
+            step()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def threads_idle(self):
+        window = self.window
+        return all(thread is None for thread in (window.importThread, window.exportThread, window.copyThread,
+                                                 window.cacheThread, window.sortThread, window.groupThread))
+
+    def run_import(self):
+        self.window.start_import(self.path)
+        self.wait(lambda: not self.threads_idle())
+
+    def select(self, top, left, bottom, right):
+        from PyQt5.QtCore import QItemSelection, QItemSelectionModel
+        model = self.window.model
+        selection = QItemSelection(model.index(top, left), model.index(bottom, right))
+        self.window.tableView.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+
+    def run(self):
+        window, results = self.window, {}
+        cases = self.cases
+        cache_dir = tempfile.mkdtemp(prefix='easycsv-bench-cache-')
+        try:
+            from file_cache import ParseCache
+            if 'import_cached' in cases:
+                window.parse_cache = ParseCache(cache_dir, min_bytes=0)
+                self.run_import()  # parses and stores
+                results['import_cached'] = self.timed(self.run_import)
+            # Parsed last, so the later cases work on a parsed sheet
+            window.parse_cache = ParseCache(cache_dir, min_bytes=1 << 62)
+            if 'import' in cases:
+                results['import'] = self.timed(self.run_import)
+            else:
+                self.run_import()
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        rows, columns = window.sheet.extent()
+        if 'export' in cases:
+            handle, output = tempfile.mkstemp(suffix='.csv', prefix='easycsv-bench-')
+            os.close(handle)
+            try:
+                results['export'] = self.timed(lambda: (window.start_export(output), self.wait(lambda: not self.threads_idle())))
+            finally:
+                if os.path.exists(output):
+                    os.remove(output)
+
+        # Half of the columns over every row
+        half = (0, 0, rows - 1, max(columns // 2, 1) - 1)
+        if 'delete' in cases or 'undo' in cases:
+            delete = lambda: window.clear_ranges('Delete', [half])
+            results['delete'] = self.timed(delete, window.model.undo)
+            window.model.undo()
+            results['undo'] = self.timed(window.model.undo, delete)
+
+        if 'copy' in cases or 'paste' in cases:
+            # Copy every row of the first two columns, paste them over the last two
+            width = min(columns, 2)
+            self.select(0, 0, rows - 1, width - 1)
+            results['copy'] = self.timed(lambda: (window.copy(), self.wait(lambda: window.copyThread is not None)))
+            window.tableView.setCurrentIndex(window.model.index(0, columns - width))
+            results['paste'] = self.timed(window.paste, window.model.undo)
+            window.model.undo()
+
+        if 'stats' in cases:
+            self.select(*half)
+
+            def reset():
+                window.summary_cache = (None, None)
+                for column in window.sheet.columns:
+                    column.numeric_cache = column.prefix_cache = None
+            results['stats'] = self.timed(window.selection_summary, reset)
+
+        if 'repaint' in cases:
+            window.resize(1280, 800)
+            window.show()
+            scrollbar = window.tableView.verticalScrollBar()
+            viewport = window.tableView.viewport()
+
+            def scroll():
+                for frame in range(REPAINT_FRAMES):
+                    scrollbar.setValue(scrollbar.maximum() * frame // (REPAINT_FRAMES - 1))
+                    viewport.repaint()
+            results['repaint'] = self.timed(scroll, lambda: scrollbar.setValue(0))
+        return {case: seconds for case, seconds in results.items() if case in cases}, rows, columns
+
+
+def run_benchmarks(datasets, sizes, cases, repeat, data_dir, log=None):
+    from PyQt5.QtWidgets import QApplication
+    from updated_main import App
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    results = {}
+    for rows in sizes:
+        for name in datasets:
+            path = generate(data_dir, name, rows)
+            window = App()
+            try:
+                timings, used_rows, used_columns = Bench(app, window, path, cases, repeat).run()
+            finally:
+                window.close()
+                window.deleteLater()
+                app.processEvents()
+            for case, seconds in timings.items():
+                key = f'{case}/{name}/{size_label(rows)}'
+                results[key] = {'seconds': seconds, 'rows': used_rows, 'cells': used_rows * used_columns}
+                if log is not None:
+                    log(f'{key:40} {1000 * seconds:10.1f} ms')
+    return results
+
+
+def environment():
+    from PyQt5.QtCore import QT_VERSION_STR
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'qt': QT_VERSION_STR,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(results, baseline, threshold=1.25, min_seconds=0.005):
+    # (key, baseline seconds, seconds, ratio) for every result more than
+    # `threshold` times slower than the baseline; differences under
+    # min_seconds are noise
+    slower = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        if ratio > threshold and result['seconds'] - base['seconds'] > min_seconds:
+            slower.append((key, base['seconds'], result['seconds'], ratio))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench', description='Time the Easy-CSV window on synthetic CSVs')
+    parser.add_argument('--sizes', default='10k,100k', help='comma-separated row counts, e.g. 10k,100k,1m,10m')
+    parser.add_argument('--datasets', default=','.join(DATASETS), help=f"comma-separated of {', '.join(DATASETS)}")
+    parser.add_argument('--cases', default=','.join(CASES), help=f"comma-separated of {', '.join(CASES)}")
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest counts')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'easycsv-bench'), help='where generated CSVs are kept')
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results JSON to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio that fails the run')
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',')]
+        datasets = args.datasets.split(',')
+        cases = args.cases.split(',')
+        for name in datasets:
+            if name not in DATASETS:
+                raise ValueError(f'Unknown dataset {name!r}, use one of {", ".join(DATASETS)}')
+        for case in cases:
+            if case not in CASES:
+                raise ValueError(f'Unknown case {case!r}, use one of {", ".join(CASES)}')
+    except ValueError as e:
+        print(f'bench: {e}', file=sys.stderr)
+        return 2
+
+    results = run_benchmarks(datasets, sizes, cases, args.repeat, args.data_dir, log=print)
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    slower = compare(results, baseline['results'], args.threshold)
+    for key, before, after, ratio in slower:
+        print(f'SLOWER {key:40} {1000 * before:10.1f} -> {1000 * after:10.1f} ms  ({ratio:.2f}x)')
+    compared = len(set(results) & set(baseline['results']))
+    print(f'{len(slower)} of {compared} results slower than the baseline by more than {args.threshold:.2f}x')
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
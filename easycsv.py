@@ -0,0 +1,203 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+
+from dialects import sniff
+from file_cache import ParseCache, format_stats
+from formats import is_table_file, parse_filters, read_table, table_schema, write_table
+from groupby import AGGREGATES, group_by, to_sheet
+from large_file import LargeCsvFile
+from lazy_imports import lazy_import
+from parallel_csv import can_parse_parallel, read_csv_parallel
+from query import sort_order
+from sheet_data import COMPRESSION_SUFFIXES, column_names, read_csv, write_csv
+from stats import summarize, format_summary
+
+np = lazy_import('numpy')
+
+# Command-line front end over the same engine the window uses. Nothing here
+# imports PyQt5, so it runs on machines without a display.
+
+
+def header_names(sheet):
+    count = sheet.column_count if sheet.read_only else sheet.extent()[1]
+    return column_names(sheet.headers, max(count, len(sheet.headers or ())))
+
+
+def resolve_column(spec, names):
+    # A column given by header name or by its C label (C1 is the first column)
+    if spec in names:
+        return names.index(spec)
+    match = re.fullmatch(r'[Cc](\d+)', spec)
+    if match and int(match.group(1)) >= 1:
+        return int(match.group(1)) - 1
+    raise ValueError(f'No column named {spec!r}')
+
+
+def detect_format(path, args):
+    # The sniffed format with whatever the command line overrides
+    fmt = sniff(path)
+    if args.encoding:
+        fmt = fmt._replace(encoding=args.encoding)
+    if args.delimiter:
+        fmt = fmt._replace(delimiter='\t' if args.delimiter == '\\t' else args.delimiter)
+    if args.header is not None:
+        fmt = fmt._replace(has_header=args.header)
+    return fmt
+
+
+def open_sheet(path, args, large=False):
+    # Parquet/Arrow input reads only the --where rows; the format options
+    # and --large are for CSV
+    if is_table_file(path):
+        if large:
+            raise ValueError('--large needs CSV input')
+        return read_table(path, filters=parse_filters(args.where, table_schema(path)) if args.where else None)
+    if args.where:
+        raise ValueError('--where needs Parquet or Arrow input')
+    fmt = detect_format(path, args)
+    if large:
+        return LargeCsvFile(path, fmt)
+    return read_csv_parallel(path, fmt) if can_parse_parallel(path, fmt) else read_csv(path, fmt)
+
+
+def summary_dict(summary):
+    result = summary._asdict()
+    result['percentiles'] = {f'p{p}': value for p, value in summary.percentiles.items()}
+    return result
+
+
+def stats_command(args):
+    sheet = open_sheet(args.file, args, args.large)
+    names = header_names(sheet)
+    columns = [resolve_column(spec, names) for spec in args.col] if args.col else range(len(names))
+    results = {}
+    for col in columns:
+        summary = summarize(sheet.numeric_chunks(slice(0, sheet.row_count), col, col))
+        if summary is not None or args.col:
+            results[names[col] if col < len(names) else f'C{col + 1}'] = summary
+    if args.large:
+        sheet.close()
+
+    if args.json:
+        json.dump({name: summary_dict(summary) if summary else None for name, summary in results.items()}, sys.stdout, indent=2)
+        print()
+        return 0
+    for name, summary in results.items():
+        print(f'[{name}]')
+        print(format_summary(summary) if summary else 'No numeric values')
+        print()
+    return 0
+
+
+def parse_sort(spec, names):
+    # COL, COL:asc or COL:desc
+    name, _, direction = spec.rpartition(':') if spec.endswith((':asc', ':desc')) else (spec, '', 'asc')
+    return resolve_column(name, names), direction == 'asc'
+
+
+def convert_command(args):
+    sheet = open_sheet(args.input, args)
+    names = header_names(sheet)
+    columns = [resolve_column(spec, names) for spec in args.columns.split(',')] if args.columns else list(range(len(names)))
+    stop = sheet.extent()[0]
+    rows = np.arange(stop)
+    if args.sort:
+        order = sort_order(sheet, [parse_sort(spec, names) for spec in args.sort])
+        rows = order[order < stop]
+
+    if is_table_file(args.output):
+        write_table(sheet.subset(rows, columns), args.output)
+        return 0
+    write_csv(sheet.subset(rows, columns), args.output, COMPRESSION_SUFFIXES.get(os.path.splitext(args.output)[1].lower()))
+    return 0
+
+
+def group_command(args):
+    sheet = open_sheet(args.file, args)
+    names = header_names(sheet)
+    keys = [resolve_column(spec, names) for spec in args.by]
+    values = [resolve_column(spec, names) for spec in args.value or ()]
+    pivot = resolve_column(args.pivot, names) if args.pivot else None
+    result = to_sheet(group_by(sheet, keys, values, args.agg.split(','), pivot))
+    if args.output is None:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(result.headers)
+        writer.writerows(result.iter_rows())
+    elif is_table_file(args.output):
+        write_table(result, args.output)
+    else:
+        write_csv(result, args.output, COMPRESSION_SUFFIXES.get(os.path.splitext(args.output)[1].lower()))
+    return 0
+
+
+def cache_command(args):
+    cache = ParseCache()
+    if args.clear:
+        cache.clear()
+    stats = cache.stats()
+    if args.json:
+        json.dump(stats, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_stats(stats))
+    return 0
+
+
+def add_format_arguments(parser):
+    # Encoding, delimiter and header are sniffed unless given here
+    parser.add_argument('--encoding', help='e.g. utf-8, latin-1, utf-16')
+    parser.add_argument('--delimiter', help='field separator, \\t for tab')
+    parser.add_argument('--header', action=argparse.BooleanOptionalAction, default=None,
+                        help='whether the first row holds column names')
+    parser.add_argument('--where', help="Parquet/Arrow input only: rows to read, e.g. 'price > 10; city = Berlin'")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='easycsv', description='Easy-CSV without the window')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stats = commands.add_parser('stats', help='summary statistics of numeric columns')
+    stats.add_argument('file')
+    stats.add_argument('--col', action='append', help='column name or C label (repeatable, default: every numeric column)')
+    add_format_arguments(stats)
+    stats.add_argument('--large', action='store_true', help='read through a memory-mapped row index instead of loading the file')
+    stats.add_argument('--json', action='store_true', help='print JSON instead of text')
+    stats.set_defaults(run=stats_command)
+
+    convert = commands.add_parser('convert', help='rewrite a CSV, Parquet or Arrow file as CSV (.gz/.zst), Parquet or Arrow/Feather')
+    convert.add_argument('input')
+    convert.add_argument('output')
+    add_format_arguments(convert)
+    convert.add_argument('--columns', help='comma-separated columns to keep, in output order')
+    convert.add_argument('--sort', action='append', help='COL, COL:asc or COL:desc (repeatable, first is major)')
+    convert.set_defaults(run=convert_command)
+
+    group = commands.add_parser('group', help='group-by/pivot summary, e.g. the sum of revenue by region and month')
+    group.add_argument('file')
+    group.add_argument('--by', action='append', required=True, help='column to group by (repeatable, first is major)')
+    group.add_argument('--value', action='append', help='column to aggregate (repeatable, default: count rows)')
+    group.add_argument('--agg', default='sum', help=f"comma-separated aggregates of {', '.join(AGGREGATES)} (default: sum)")
+    group.add_argument('--pivot', help='column whose values become column groups')
+    group.add_argument('--output', help='CSV, Parquet or Arrow file to write instead of printing CSV')
+    add_format_arguments(group)
+    group.set_defaults(run=group_command)
+
+    cache = commands.add_parser('cache', help="show the window's parse cache statistics")
+    cache.add_argument('--clear', action='store_true', help='delete every cached file first')
+    cache.add_argument('--json', action='store_true', help='print JSON instead of text')
+    cache.set_defaults(run=cache_command)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        print(f'easycsv: {e}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import glob
+import hashlib
+import json
+import os
+
+from formats import read_table, write_table
+
+# Parsed CSVs kept on disk as Arrow files, so reopening an unchanged file
+# maps its typed columns instead of parsing it again. An entry is named
+# after a fingerprint of the file (path, size, mtime, the bytes at its head
+# and tail) and the format it was read with; a changed file simply gets a
+# new name and its old entry ages out. Least recently used entries are
+# deleted once the cache outgrows its size limit.
+
+CACHE_VERSION = 1  # bump when the stored columns change meaning
+CACHE_MIN_BYTES = 4 << 20  # smaller files parse faster than they hash and map
+STATS_FILE = 'stats.json'
+
+
+def default_cache_dir():
+    if os.environ.get('EASYCSV_CACHE_DIR'):
+        return os.environ['EASYCSV_CACHE_DIR']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'easycsv')
+
+
+def fingerprint(path, fmt, sample_bytes=64 << 10):
+    # Cheap enough for every open: two small reads and a stat. The head and
+    # tail catch an edit that kept size and mtime (e.g. restored by a copy).
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, tuple(fmt))).encode())
+    with open(path, 'rb') as file:
+        digest.update(file.read(sample_bytes))
+        file.seek(max(stat.st_size - sample_bytes, 0))
+        digest.update(file.read(sample_bytes))
+    return digest.hexdigest()
+
+
+class ParseCache:
+    # Counters cover this session (hits, misses, stores, evictions) and are
+    # also added to a running total kept next to the entries.
+    def __init__(self, directory=None, limit=4 << 30, min_bytes=CACHE_MIN_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.limit = limit
+        self.min_bytes = min_bytes
+        self.session = dict.fromkeys(('hits', 'misses', 'stores', 'evictions'), 0)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.arrow')
+
+    def worth_caching(self, path):
+        try:
+            return os.path.getsize(path) >= self.min_bytes
+        except OSError:
+            return False
+
+    def load(self, path, fmt):
+        # The cached SheetData for this version of the file, or None
+        if not self.worth_caching(path):
+            return None
+        entry = self.entry_path(fingerprint(path, fmt))
+        try:
+            sheet = read_table(entry)
+            os.utime(entry)  # marks it recently used
+        except FileNotFoundError:
+            self.count('misses')
+            return None
+        except (OSError, ValueError):
+            self.remove(entry)  # unreadable, e.g. cut short by a crash
+            self.count('misses')
+            return None
+        self.count('hits')
+        return sheet
+
+    def store(self, path, fmt, sheet):
+        # Written under a temporary name and renamed, so a reader never sees
+        # half an entry
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.entry_path(fingerprint(path, fmt))
+        partial = f'{entry}.{os.getpid()}.part'
+        try:
+            write_table(sheet, partial, whole=True)
+            os.replace(partial, entry)
+        finally:
+            self.remove(partial)
+        self.count('stores')
+        self.evict()
+
+    def entries(self):
+        # (path, size, last used) of every entry, least recently used first
+        found = []
+        for entry in glob.glob(os.path.join(glob.escape(self.directory), '*.arrow')):
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            found.append((entry, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda item: item[2])
+
+    def evict(self):
+        # Oldest first; a new entry only goes if it alone exceeds the limit
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for entry, size, _ in entries:
+            if total <= self.limit:
+                break
+            if self.remove(entry):
+                total -= size
+                self.count('evictions')
+
+    def remove(self, entry):
+        try:
+            os.remove(entry)
+        except OSError:
+            return False
+        return True
+
+    def clear(self):
+        for entry, _, _ in self.entries():
+            self.remove(entry)
+
+    def count(self, name):
+        # Session and running totals; the totals are best effort
+        self.session[name] += 1
+        totals = self.totals()
+        totals[name] = totals.get(name, 0) + 1
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, STATS_FILE), 'w') as file:
+                json.dump(totals, file)
+        except OSError:
+            pass
+
+    def totals(self):
+        try:
+            with open(os.path.join(self.directory, STATS_FILE)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def stats(self):
+        entries = self.entries()
+        return {'directory': self.directory, 'entries': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'limit': self.limit, 'session': dict(self.session), 'total': self.totals()}
+
+
+def format_stats(stats):
+    session, total = stats['session'], stats['total']
+    lines = [f"Cache: {stats['directory']}",
+             f"Entries: {stats['entries']} ({stats['bytes'] / (1 << 20):.1f} MB of {stats['limit'] / (1 << 20):.0f} MB)"]
+    for name in ('hits', 'misses', 'stores', 'evictions'):
+        lines.append(f'{name.capitalize()}: {session[name]} this session, {total.get(name, 0)} in total')
+    return '\n'.join(lines)
@@ -0,0 +1,59 @@
+import os
+
+from dialects import DEFAULT_FORMAT, ascii_compatible
+from lazy_imports import lazy_import
+from parallel_csv import decode_rows
+
+np = lazy_import('numpy')
+
+# Reading a CSV that another process keeps appending to, e.g. a log. Only
+# the bytes past the last read are looked at, and only whole records are
+# taken: a record still being written stays for the next read. A newline
+# ends a record when an even number of quotes precede it since the last
+# record start, the rule build_row_index uses, so the file has to be in an
+# ASCII-compatible encoding.
+
+
+class CsvTail:
+    def __init__(self, path, fmt=DEFAULT_FORMAT):
+        if not ascii_compatible(fmt):
+            raise ValueError(f'Only files in ASCII-compatible encodings can be followed, not {fmt.encoding}')
+        self.path = path
+        self.fmt = fmt
+        self.offset = 0  # always at a record start
+        self.headers = None
+
+    def shrank(self):
+        # True when the file is now shorter than what was read, i.e. it was
+        # truncated or replaced (log rotation) and has to be read again
+        try:
+            return os.path.getsize(self.path) < self.offset
+        except OSError:
+            return False
+
+    def rewind(self):
+        self.offset = 0
+        self.headers = None
+
+    def read(self, max_bytes=4 << 20):
+        # (rows of the records completed since the last read, whether more
+        # bytes are already waiting). At most about max_bytes are parsed per
+        # call so a big backlog is taken in steps.
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read(max_bytes)
+            more = bool(file.read(1))
+        block = np.frombuffer(data, dtype=np.uint8)
+        parity = np.cumsum(block == ord(self.fmt.quotechar), dtype=np.uint8) & 1
+        ends = np.flatnonzero((block == ord('\n')) & (parity == 0))
+        if not len(ends):
+            if len(data) == max_bytes:
+                # A record longer than max_bytes: read on until it ends
+                return self.read(2 * max_bytes)
+            return [], False
+        stop = int(ends[-1]) + 1
+        rows = decode_rows(data[:stop], self.fmt, not self.offset)
+        if self.fmt.has_header and not self.offset and rows:
+            self.headers = rows.pop(0)
+        self.offset += stop
+        return rows, more
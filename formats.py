@@ -0,0 +1,236 @@
+import json
+import os
+import re
+from datetime import date, datetime
+
+from lazy_imports import lazy_import
+from sheet_data import Column, SheetData, column_names, infer_column
+
+np = lazy_import('numpy')
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+feather = lazy_import('pyarrow.feather')
+
+# Parquet and Arrow IPC (Feather v2) files in and out of SheetData. Both
+# keep the columns typed, so nothing has to be parsed or inferred again.
+# An uncompressed Arrow file is memory-mapped and its numbers, timestamps
+# and category codes become Column arrays over the mapped pages without a
+# copy; they are copied only when a cell is first edited. Parquet has to be
+# decoded, but only the chosen columns and the row groups that can hold
+# matching rows are read.
+
+TABLE_SUFFIXES = ('.parquet', '.arrow', '.feather', '.ipc')
+# Schema metadata holding what Arrow types don't: each column's print spec
+# (e.g. a float's decimals), datetime unit and original header text
+METADATA_KEY = b'easycsv'
+DATETIME_UNITS = ('D', 's', 'ms', 'us', 'ns')
+FILTER_CONDITION = re.compile(r'\s*(.+?)\s*(==|!=|<=|>=|=|<|>|\s(?:not\s+)?in\s)\s*(.*?)\s*$')
+
+
+def is_table_file(path):
+    return os.path.splitext(path)[1].lower() in TABLE_SUFFIXES
+
+
+def require_pyarrow():
+    try:
+        pa.__version__
+    except ImportError as e:
+        raise ValueError(f'Parquet and Arrow files need pyarrow ({e})')
+
+
+def table_schema(path):
+    # Column names and types without reading any data
+    require_pyarrow()
+    try:
+        if os.path.splitext(path)[1].lower() == '.parquet':
+            return pq.read_schema(path)
+        return pa.ipc.open_file(pa.memory_map(path)).schema
+    except pa.ArrowException as e:
+        raise ValueError(f'{os.path.basename(path)}: {e}') from e
+
+
+def filter_value(text, field):
+    # A condition's value in the field's type, so Parquet can compare it
+    # against row group statistics
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'':
+        return text[1:-1]
+    value_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+    try:
+        if pa.types.is_integer(value_type):
+            return int(text)
+        if pa.types.is_floating(value_type):
+            return float(text)
+        if pa.types.is_boolean(value_type):
+            return {'true': True, 'false': False}[text.lower()]
+        if pa.types.is_timestamp(value_type):
+            return datetime.fromisoformat(text)
+        if pa.types.is_date(value_type):
+            return date.fromisoformat(text)
+    except (ValueError, KeyError):
+        raise ValueError(f'{field.name} cannot be compared with {text!r}')
+    return text
+
+
+def parse_filters(text, schema):
+    # 'price > 10; city in Berlin, Paris' into pyarrow's [(name, op, value)]
+    # form; every condition must hold. None when text is blank.
+    filters = []
+    for condition in filter(str.strip, text.split(';')):
+        match = FILTER_CONDITION.fullmatch(condition)
+        if match is None:
+            raise ValueError(f'Not a condition: {condition.strip()!r} (expected e.g. price > 10)')
+        name, op, value = match.groups()
+        op = ' '.join(op.split())
+        if name not in schema.names:
+            raise ValueError(f'No column named {name!r}')
+        field = schema.field(name)
+        if op.endswith('in'):
+            filters.append((name, op, [filter_value(item.strip(), field) for item in value.split(',')]))
+        else:
+            filters.append((name, '=' if op == '==' else op, filter_value(value, field)))
+    return filters or None
+
+
+def buffer_view(array, dtype):
+    # The values of a fixed-width Arrow array as a read-only NumPy array over
+    # the same memory. Slots under nulls hold arbitrary values.
+    dtype = np.dtype(dtype)
+    if not len(array):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(array.buffers()[1], dtype=dtype, count=len(array), offset=array.offset * dtype.itemsize)
+
+
+def coarsest_unit(values, mask):
+    # Timestamps in the coarsest unit that holds every one exactly, so they
+    # print the way they were written in the CSV (dates without a time)
+    unit = np.datetime_data(values.dtype)[0]
+    ticks = values.view(np.int64)[~mask]
+    for coarser in DATETIME_UNITS[:DATETIME_UNITS.index(unit)]:
+        step = np.timedelta64(1, coarser) // np.timedelta64(1, unit)
+        if not (ticks % step).any():
+            return values.astype(f'datetime64[{coarser}]')
+    return values
+
+
+def texts_of(array):
+    try:
+        texts = array.cast(pa.string()).fill_null('').to_numpy(zero_copy_only=False)
+    except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+        texts = ['' if value is None else str(value) for value in array.to_pylist()]
+    return np.asarray(texts, dtype=object)
+
+
+def arrow_column(array, spec=None, saved_unit=None):
+    # Column over one Arrow array. Numbers, timestamps and dictionary codes
+    # are views of the array's buffers; text has to become Python strings.
+    kind = array.type
+    mask = array.is_null().to_numpy(zero_copy_only=False).copy() if array.null_count else np.zeros(len(array), dtype=bool)
+    try:
+        if pa.types.is_dictionary(kind):
+            indices = array.indices if kind.index_type == pa.int32() else array.indices.cast(pa.int32())
+            return Column('category', buffer_view(indices, np.int32), mask, texts_of(array.dictionary))
+        if pa.types.is_integer(kind):
+            array = array if kind == pa.int64() else array.cast(pa.int64())
+            return Column('int', buffer_view(array, np.int64), mask)
+        if pa.types.is_floating(kind):
+            array = array if kind == pa.float64() else array.cast(pa.float64())
+            return Column('float', buffer_view(array, np.float64), mask, spec)
+        if pa.types.is_boolean(kind):
+            values = array.fill_null(False).to_numpy(zero_copy_only=False).copy()
+            return Column('bool', values, mask, tuple(spec) if spec else ('False', 'True'))
+        if pa.types.is_timestamp(kind) or pa.types.is_date(kind):
+            unit = kind.unit if pa.types.is_timestamp(kind) else 's'
+            if kind != pa.timestamp(unit):
+                array = array.cast(pa.timestamp(unit))  # dates, and UTC for zoned timestamps
+            values = buffer_view(array, f'datetime64[{unit}]')
+            values = values.astype(f'datetime64[{saved_unit}]', copy=False) if saved_unit else coarsest_unit(values, mask)
+            return Column('datetime', values, mask, spec or ' ')
+    except pa.ArrowInvalid:
+        pass  # e.g. a uint64 beyond int64, kept as text
+    if pa.types.is_string(kind) or pa.types.is_large_string(kind):
+        return Column('str', texts_of(array))
+    return infer_column(texts_of(array))
+
+
+def read_table(path, columns=None, filters=None):
+    # SheetData from a Parquet or Arrow file. columns is a list of names;
+    # filters is pyarrow's [(name, op, value)] form (see parse_filters), used
+    # by Parquet to skip row groups and applied to the mapped Arrow table.
+    require_pyarrow()
+    try:
+        if os.path.splitext(path)[1].lower() == '.parquet':
+            table = pq.read_table(path, columns=columns, filters=filters)
+        else:
+            # The filter may test columns that aren't kept, so those are read
+            # too and dropped after filtering
+            wanted = columns
+            if columns is not None and filters:
+                wanted = list(dict.fromkeys(list(columns) + [name for name, _, _ in filters]))
+            table = feather.read_table(path, columns=wanted, memory_map=True)
+            if filters:
+                table = table.filter(pq.filters_to_expression(filters))
+            if wanted is not columns:
+                table = table.select(columns)
+        saved = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b'{}'))
+        specs, units = saved.get('specs', {}), saved.get('units', {})
+        # One chunk per column keeps the views zero-copy; several are joined
+        table = table.unify_dictionaries()
+        sheet_columns = []
+        for name, chunks in zip(table.column_names, table.columns):
+            array = chunks.chunk(0) if chunks.num_chunks == 1 else chunks.combine_chunks()
+            sheet_columns.append(arrow_column(array, specs.get(name), units.get(name)))
+    except pa.ArrowException as e:
+        raise ValueError(f'{os.path.basename(path)}: {e}') from e
+    headers = list(table.column_names)
+    if 'headers' in saved:
+        # A sheet without a header row comes back without one when whole
+        if saved['headers'] is None:
+            headers = None if columns is None else headers
+        else:
+            headers = [saved['headers'].get(name, name) for name in headers]
+    return SheetData(sheet_columns, table.num_rows, headers)
+
+
+def write_table(sheet, path, columns=None, batch_rows=1 << 20, progress=None, cancelled=None, whole=False):
+    # Writes the used part of the sheet (or just `columns`, by index) with the
+    # header names as column names; whole keeps trailing empty rows and
+    # columns too, so the parse cache reads back the sheet a parse gives. Parquet goes out one row group of
+    # batch_rows at a time, so progress(rows_written, total_rows) and
+    # cancelled() behave as in write_csv; an Arrow file is one record batch,
+    # which is what lets read_table map it without copying.
+    require_pyarrow()
+    if sheet.read_only:
+        raise ValueError('Import the file to save it as Parquet or Arrow; the large-file view has no typed columns')
+    row_count, column_count = (sheet.row_count, sheet.column_count) if whole else sheet.extent()
+    columns = list(range(max(column_count, len(sheet.headers or ())))) if columns is None else list(columns)
+    names = column_names(sheet.headers, max(columns, default=-1) + 1)
+    names = [names[col] for col in columns]
+    if row_count != sheet.row_count or columns != list(range(sheet.column_count)):
+        sheet = sheet.subset(np.arange(row_count), columns)
+
+    try:
+        table = pa.Table.from_pandas(sheet.to_dataframe(names), preserve_index=False)
+        saved = {
+            'specs': {name: column.spec for name, column in zip(names, sheet.columns)
+                      if column.kind in ('float', 'bool', 'datetime') and column.spec is not None},
+            'units': {name: np.datetime_data(column.values.dtype)[0] for name, column in zip(names, sheet.columns)
+                      if column.kind == 'datetime'},
+            'headers': dict(zip(names, sheet.headers + [''] * len(names))) if sheet.headers else None,
+        }
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(saved)})
+        if os.path.splitext(path)[1].lower() != '.parquet':
+            with pa.ipc.new_file(path, table.schema) as writer:
+                writer.write_table(table.combine_chunks())
+            if progress is not None and row_count:
+                progress(row_count, row_count)
+            return True
+        with pq.ParquetWriter(path, table.schema) as writer:
+            for start in range(0, row_count, batch_rows):
+                if cancelled is not None and cancelled():
+                    return False
+                writer.write_table(table.slice(start, batch_rows))
+                if progress is not None:
+                    progress(min(start + batch_rows, row_count), row_count)
+    except pa.ArrowException as e:
+        raise ValueError(f'{os.path.basename(path)}: {e}') from e
+    return True
@@ -0,0 +1,258 @@
+import ast
+import inspect
+import re
+import warnings
+
+from lazy_imports import lazy_import
+from sheet_data import FLOAT_SPEC, Column
+
+np = lazy_import('numpy')
+
+# Computed columns: a formula such as =C3*C4 or =C2/SUM(C2) fills a whole
+# column at once. The formula is parsed with ast (never eval'd) into a tree
+# of NumPy operations over the numeric view of the columns it reads, so a
+# million rows cost a handful of array operations. Empty or non-numeric
+# cells read as NaN and come out empty.
+#
+# The engine keeps the versions of the columns each formula read. After an
+# edit only formulas whose inputs moved on are evaluated again, in
+# dependency order, and when the inputs only grew (an import chunk, a
+# followed file) a formula without aggregates is evaluated on the new rows
+# alone.
+
+COLUMN_NAME = re.compile(r'[Cc](\d+)')
+
+
+def _count(values):
+    return np.count_nonzero(~np.isnan(values))
+
+
+def _if(condition, then, otherwise):
+    return np.where(np.nan_to_num(condition) != 0, then, otherwise)
+
+
+def arity(function):
+    # Number of arguments a ufunc or a helper takes
+    return function.nin if isinstance(function, np.ufunc) else len(inspect.signature(function).parameters)
+
+
+def constant(node):
+    # The number a node spells out, e.g. 2 or -1, else None
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+# NumPy functions are named rather than referenced: reading np.add here
+# would import NumPy with this module, at the window's startup
+AGGREGATES = {
+    'SUM': 'nansum', 'AVG': 'nanmean', 'AVERAGE': 'nanmean', 'MEAN': 'nanmean',
+    'MIN': 'nanmin', 'MAX': 'nanmax', 'MEDIAN': 'nanmedian', 'COUNT': _count,
+    'STDEV': lambda values: np.nanstd(values, ddof=1), 'VAR': lambda values: np.nanvar(values, ddof=1),
+}
+FUNCTIONS = {
+    'ABS': 'abs', 'SQRT': 'sqrt', 'EXP': 'exp', 'LN': 'log', 'LOG': 'log10',
+    'INT': 'floor', 'IF': _if,
+}
+OPERATORS = {
+    ast.Add: 'add', ast.Sub: 'subtract', ast.Mult: 'multiply', ast.Div: 'divide',
+    ast.FloorDiv: 'floor_divide', ast.Mod: 'mod', ast.Pow: 'power', ast.BitXor: 'power',
+    ast.Lt: 'less', ast.LtE: 'less_equal', ast.Gt: 'greater', ast.GtE: 'greater_equal',
+    ast.Eq: 'equal', ast.NotEq: 'not_equal', ast.USub: 'negative', ast.UAdd: 'positive',
+}
+
+
+def resolve(function):
+    # A table entry as a callable
+    return getattr(np, function) if isinstance(function, str) else function
+
+
+class Formula:
+    # A compiled formula: columns holds the column indexes it reads,
+    # elementwise is False when an aggregate makes every row depend on all
+    # rows. evaluate(sheet, start, stop) gives float64 results for rows
+    # [start, stop).
+    def __init__(self, text):
+        self.text = text.strip()
+        source = self.text[1:] if self.text.startswith('=') else self.text
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f'Invalid formula {self.text!r}: {e.msg}')
+        self.columns = set()
+        self.elementwise = True
+        self.function = self.compile(tree.body)
+
+    def compile(self, node):
+        # A function (sheet, start, stop, row_count) -> array or scalar
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda sheet, start, stop, rows: value
+        if isinstance(node, ast.Name):
+            match = COLUMN_NAME.fullmatch(node.id)
+            if match is None or int(match.group(1)) < 1:
+                raise ValueError(f'Unknown name {node.id!r}: columns are C1, C2, ...')
+            col = int(match.group(1)) - 1
+            self.columns.add(col)
+            return lambda sheet, start, stop, rows: column_values(sheet, col, start, stop)
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            operator, left, right = resolve(OPERATORS[type(node.op)]), self.compile(node.left), self.compile(node.right)
+            return lambda *args: operator(left(*args), right(*args))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in OPERATORS:
+            operator, operand = resolve(OPERATORS[type(node.op)]), self.compile(node.operand)
+            return lambda *args: operator(operand(*args))
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in OPERATORS:
+            operator, left, right = resolve(OPERATORS[type(node.ops[0])]), self.compile(node.left), self.compile(node.comparators[0])
+            return lambda *args: operator(left(*args), right(*args)).astype(np.float64)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self.compile_call(node.func.id.upper(), node.args)
+        raise ValueError(f'Not supported in a formula: {ast.unparse(node)!r}')
+
+    def compile_call(self, name, nodes):
+        if name == 'ROUND':
+            # One number of digits for the whole column
+            digits = constant(nodes[1]) if len(nodes) == 2 else 0
+            if len(nodes) not in (1, 2) or digits is None or digits != int(digits):
+                raise ValueError('ROUND takes a value and a whole number of digits, e.g. ROUND(C1, 2)')
+            inner, digits = self.compile(nodes[0]), int(digits)
+            return lambda *call: np.round(inner(*call), digits)
+        args = [self.compile(node) for node in nodes]
+        if name in AGGREGATES and len(args) == 1:
+            # Over every row, whatever rows are being evaluated
+            self.elementwise = False
+            aggregate, inner = resolve(AGGREGATES[name]), args[0]
+            return lambda sheet, start, stop, rows: float(aggregate(np.broadcast_to(inner(sheet, 0, rows, rows), rows)))
+        if name in ('MIN', 'MAX') and len(args) > 1:
+            combine = np.fmin if name == 'MIN' else np.fmax
+            return lambda *call: combine.reduce([np.broadcast_to(arg(*call), call[2] - call[1]) for arg in args])
+        if name in AGGREGATES:
+            raise ValueError(f'{name} takes ' + ('at least one argument' if name in ('MIN', 'MAX') else 'one argument'))
+        if name in FUNCTIONS:
+            function = resolve(FUNCTIONS[name])
+            count = arity(function)
+            if len(args) != count:
+                raise ValueError(f'{name} takes {count} argument' + ('s' if count > 1 else ''))
+            return lambda *call: function(*[arg(*call) for arg in args])
+        raise ValueError(f'Unknown function {name}')
+
+    def evaluate(self, sheet, start, stop):
+        with warnings.catch_warnings(), np.errstate(all='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)  # e.g. AVG of no numbers
+            result = self.function(sheet, start, stop, sheet.row_count)
+        return np.array(np.broadcast_to(result, stop - start), dtype=np.float64)
+
+
+def column_values(sheet, col, start, stop):
+    # Numeric cells of a column for rows [start, stop), NaN past its end
+    values = np.full(stop - start, np.nan)
+    if col < sheet.column_count:
+        numeric = sheet.columns[col].numeric()[start:stop]
+        values[:len(numeric)] = numeric
+    return values
+
+
+def result_column(values):
+    # Whole numbers are stored as int so they print without a '.0'
+    mask = np.isnan(values)
+    filled = values[~mask]
+    if np.isfinite(filled).all() and (filled == np.round(filled)).all() and (np.abs(filled) < 2 ** 53).all():
+        return Column('int', np.where(mask, 0, values).astype(np.int64), mask)
+    return Column('float', values, mask, FLOAT_SPEC)
+
+
+class FormulaEngine:
+    # The formulas of one sheet by column, with what each last evaluation saw:
+    # (input versions, input edit versions, row count, own version after the
+    # write), so up-to-date columns are skipped.
+    def __init__(self):
+        self.formulas = {}
+        self.order = []
+        self.states = {}
+
+    def __contains__(self, col):
+        return col in self.formulas
+
+    def text(self, col):
+        return self.formulas[col].text if col in self.formulas else None
+
+    def define(self, col, text, sheet):
+        # Tried on the sheet's first row before it is taken in, so a formula
+        # that can't be evaluated is refused here rather than on every update
+        formula = Formula(text)
+        if col in formula.columns:
+            raise ValueError(f'C{col + 1} cannot read itself')
+        try:
+            formula.evaluate(sheet, 0, min(sheet.row_count, 1))
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f'Invalid formula {formula.text!r}: {e}') from e
+        previous = self.formulas.get(col)
+        self.formulas[col] = formula
+        try:
+            self.order = self.dependency_order()
+        except ValueError:
+            if previous is None:
+                del self.formulas[col]
+            else:
+                self.formulas[col] = previous
+            raise
+        self.states.pop(col, None)
+
+    def remove(self, col):
+        # The column keeps its last values as plain cells
+        self.formulas.pop(col, None)
+        self.states.pop(col, None)
+        self.order = [c for c in self.order if c != col]
+
+    def dependency_order(self):
+        # Formula columns so that each comes after the formula columns it reads
+        order, done = [], set()
+
+        def visit(col, path):
+            if col in path:
+                raise ValueError('Formulas refer to each other in a cycle: ' + ' -> '.join(f'C{c + 1}' for c in path + (col,)))
+            if col in done or col not in self.formulas:
+                return
+            for dep in sorted(self.formulas[col].columns):
+                visit(dep, path + (col,))
+            done.add(col)
+            order.append(col)
+
+        for col in sorted(self.formulas):
+            visit(col, ())
+        return order
+
+    def update(self, sheet):
+        # Brings every formula column up to date; returns the columns written
+        changed = []
+        for col in self.order:
+            formula = self.formulas[col]
+            inputs = [sheet.columns[dep] if dep < sheet.column_count else None for dep in sorted(formula.columns)]
+            versions = tuple(column.version if column else -1 for column in inputs)
+            edit_versions = tuple(column.edit_version if column else -1 for column in inputs)
+            sheet.ensure_size(0, col + 1)
+            column = sheet.columns[col]
+            state = self.states.get(col)
+            rows = sheet.row_count
+            if state is not None and state[3] == column.version:
+                if state[0] == versions and state[2] == rows:
+                    continue
+                if formula.elementwise and state[1] == edit_versions and state[2] < rows and self.extend(formula, sheet, column, state[2]):
+                    self.states[col] = (versions, edit_versions, rows, column.version)
+                    changed.append(col)
+                    continue
+            column.assign(result_column(formula.evaluate(sheet, 0, rows)))
+            self.states[col] = (versions, edit_versions, rows, column.version)
+            changed.append(col)
+        return changed
+
+    def extend(self, formula, sheet, column, done):
+        # Evaluates the rows added since `done`; False if they don't fit the
+        # column's kind and the whole column has to be written
+        values = formula.evaluate(sheet, done, sheet.row_count)
+        tail = Column('float', values, np.isnan(values), FLOAT_SPEC) if column.kind == 'float' else result_column(values)
+        if tail.kind != column.kind or column.length != done:
+            return False
+        column.extend(tail, done)
+        return True
@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+from formulas import result_column
+from lazy_imports import lazy_import
+from query import sort_codes
+from sheet_data import SheetData, column_names, infer_column
+
+np = lazy_import('numpy')
+
+# Group-by and pivot summaries, e.g. the sum of revenue by region and month.
+# Rows are grouped by sort-based codes (sort_codes, cached per column until
+# it changes), several key columns are folded into one dense group code, and
+# every aggregate is a bincount or reduceat over the numeric view of a value
+# column: a few passes over the arrays, no Python loop per row or group.
+# Groups come out in key order with empty keys last.
+
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'std', 'var')
+
+Grouping = namedtuple('Grouping', 'headers keys values')
+
+
+def group_codes(sheet, cols, length):
+    # (dense group code per row, number of groups) for the key columns over
+    # the first length rows
+    groups, count = np.zeros(length, dtype=np.int64), 1
+    for col in cols:
+        codes, null_code = sort_codes(sheet.columns[col], length)
+        uniques, groups = np.unique(groups * (null_code + 1) + codes, return_inverse=True)
+        count = len(uniques)
+        groups = groups.reshape(-1)
+    return groups, count
+
+
+def first_rows(groups, count):
+    # A row of every group, to read its key texts from
+    rows = np.empty(count, dtype=np.int64)
+    rows[groups[::-1]] = np.arange(len(groups) - 1, -1, -1)
+    return rows
+
+
+def aggregate(values, groups, count, name):
+    # One float per group, NaN where a group has no numbers (count gives 0)
+    filled = ~np.isnan(values)
+    groups, values = groups[filled], values[filled]
+    counts = np.bincount(groups, minlength=count)
+    if name == 'count':
+        return counts.astype(np.float64)
+    result = np.full(count, np.nan)
+    present = counts > 0
+    if name in ('min', 'max'):
+        order = np.argsort(groups, kind='stable')
+        starts = np.r_[0, np.cumsum(counts)[:-1]][present]
+        reduce = np.minimum if name == 'min' else np.maximum
+        result[present] = reduce.reduceat(values[order], starts) if len(values) else []
+        return result
+    sums = np.bincount(groups, values, minlength=count)
+    if name == 'sum':
+        result[present] = sums[present]
+        return result
+    means = sums[present] / counts[present]
+    if name == 'mean':
+        result[present] = means
+        return result
+    # Population variance as in the summary, from deviations to the group mean
+    full_means = np.zeros(count)
+    full_means[present] = means
+    m2 = np.bincount(groups, np.square(values - full_means[groups]), minlength=count)
+    result[present] = m2[present] / counts[present]
+    return np.sqrt(result) if name == 'std' else result
+
+
+def group_by(sheet, keys, values=(), aggregates=('sum',), pivot=None):
+    # Summary of the value columns per distinct combination of the key
+    # columns: a row per group with its key texts, then a column per value
+    # column and aggregate. With a pivot column each of its distinct values
+    # gets its own set of aggregate columns. Without value columns the
+    # groups' row counts are given.
+    if not keys:
+        raise ValueError('Group by at least one column')
+    for name in aggregates:
+        if name not in AGGREGATES:
+            raise ValueError(f'Unknown aggregate {name!r}, use one of {", ".join(AGGREGATES)}')
+    if pivot is not None and pivot in keys:
+        raise ValueError('The pivot column cannot also be a group column')
+    if max(list(keys) + list(values) + ([pivot] if pivot is not None else [])) >= sheet.column_count:
+        raise ValueError('No such column')
+    names = column_names(sheet.headers, sheet.column_count)
+    # Read once: a followed file may grow while the summary is computed
+    length = sheet.row_count
+
+    groups, count = group_codes(sheet, keys, length)
+    key_rows = first_rows(groups, count)
+    key_texts = [sheet.columns[col].take_at(key_rows) for col in keys]
+    cells, width, labels = groups, 1, ['']
+    if pivot is not None:
+        pivots, width = group_codes(sheet, [pivot], length)
+        labels = [f'{text or "(empty)"} ' for text in sheet.columns[pivot].take_at(first_rows(pivots, width))]
+        cells = groups * width + pivots
+
+    measures = [(f'{name}({names[col]})', sheet.columns[col].numeric(), name) for col in values for name in aggregates]
+    if not measures:
+        measures = [('count', np.zeros(length), 'count')]
+    headers, results = [names[col] for col in keys], []
+    for title, numeric, name in measures:
+        numbers = np.full(length, np.nan)
+        numbers[:min(len(numeric), length)] = numeric[:length]
+        table = aggregate(numbers, cells, count * width, name).reshape(count, width)
+        for p, label in enumerate(labels):
+            headers.append(label + title)
+            results.append(table[:, p])
+    return Grouping(headers, key_texts, results)
+
+
+def to_sheet(grouping):
+    # A fresh sheet per call, so the Grouping can be cached and reused
+    columns = [infer_column(np.array(texts, dtype=object)) for texts in grouping.keys]
+    columns += [result_column(values.copy()) for values in grouping.values]
+    return SheetData(columns, len(grouping.keys[0]), list(grouping.headers))
@@ -0,0 +1,89 @@
+import sys
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+
+class PackedBlock:
+    # Texts of a rectangle packed column by column into one string plus an
+    # offsets array, far smaller than a list of str objects. A block of only
+    # empty cells keeps no offsets at all.
+    def __init__(self, columns):
+        self.height = len(columns[0]) if columns else 0
+        self.width = len(columns)
+        cells = [text for texts in columns for text in texts]
+        self.text = ''.join(cells)
+        if self.text:
+            self.offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+            np.cumsum(np.fromiter(map(len, cells), dtype=np.int64, count=len(cells)), out=self.offsets[1:])
+        else:
+            self.offsets = None
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.text) + (self.offsets.nbytes if self.offsets is not None else 0)
+
+    def columns(self):
+        if self.offsets is None:
+            return [[''] * self.height for _ in range(self.width)]
+        text, bounds = self.text, self.offsets.tolist()
+        columns = []
+        for col in range(self.width):
+            first = col * self.height
+            columns.append([text[bounds[i]:bounds[i + 1]] for i in range(first, first + self.height)])
+        return columns
+
+
+class RangeEdit:
+    # One undoable action: new texts written over one or more rectangles,
+    # kept as (rows, left, before, after) with packed blocks. rows is the top
+    # row, or an array of rows when the edit was made in a sorted view.
+    def __init__(self, label):
+        self.label = label
+        self.parts = []
+
+    def add(self, rows, left, before, after):
+        self.parts.append((rows, left, PackedBlock(before), PackedBlock(after)))
+
+    @property
+    def nbytes(self):
+        return sum(before.nbytes + after.nbytes + getattr(rows, 'nbytes', 0)
+                   for rows, _, before, after in self.parts)
+
+
+class History:
+    # Linear undo/redo history. Once the packed edits exceed memory_limit the
+    # oldest ones are dropped; the latest edit is always kept.
+    def __init__(self, memory_limit=256 << 20):
+        self.memory_limit = memory_limit
+        self.entries = []
+        self.position = 0
+        self.memory = 0
+
+    def push(self, edit):
+        for dropped in self.entries[self.position:]:
+            self.memory -= dropped.nbytes
+        del self.entries[self.position:]
+        self.entries.append(edit)
+        self.memory += edit.nbytes
+        while self.memory > self.memory_limit and len(self.entries) > 1:
+            self.memory -= self.entries.pop(0).nbytes
+        self.position = len(self.entries)
+
+    def undo(self):
+        if not self.position:
+            return None
+        self.position -= 1
+        return self.entries[self.position]
+
+    def redo(self):
+        if self.position == len(self.entries):
+            return None
+        self.position += 1
+        return self.entries[self.position - 1]
+
+    def clear(self):
+        self.entries = []
+        self.position = 0
+        self.memory = 0
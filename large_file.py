@@ -0,0 +1,165 @@
+import csv
+import io
+import mmap
+import os
+from collections import OrderedDict
+
+from dialects import DEFAULT_FORMAT, ascii_compatible
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+INDEX_SUFFIX = '.rowidx.npz'
+
+
+def build_row_index(buffer, block_size=8 << 20, quote=ord('"')):
+    # Offsets of every record start plus the end of the file, found in one
+    # vectorised pass. A newline only ends a record when an even number of
+    # quote characters precede it, so quoted fields may span lines.
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    size = len(data)
+    offsets = [np.zeros(1, dtype=np.int64)]
+    in_quotes = np.uint8(0)
+    for start in range(0, size, block_size):
+        block = data[start:start + block_size]
+        # uint8 wraps at 256, which keeps the parity intact
+        parity = (np.cumsum(block == quote, dtype=np.uint8) + in_quotes) & 1
+        ends = np.flatnonzero((block == ord('\n')) & (parity == 0))
+        offsets.append(ends.astype(np.int64) + start + 1)
+        in_quotes = parity[-1]
+    offsets = np.concatenate(offsets)
+    if offsets[-1] != size:
+        offsets = np.append(offsets, size)
+    return offsets
+
+
+def load_row_index(path, quote=ord('"')):
+    # Reuses the sidecar index when it was built for this exact file version
+    stat = os.stat(path)
+    index_path = path + INDEX_SUFFIX
+    try:
+        with np.load(index_path) as saved:
+            if (int(saved['size']) == stat.st_size and int(saved['mtime']) == stat.st_mtime_ns
+                    and int(saved['quote']) == quote):
+                return saved['offsets']
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def save_row_index(path, offsets, quote=ord('"')):
+    stat = os.stat(path)
+    try:
+        with open(path + INDEX_SUFFIX, 'wb') as file:
+            np.savez(file, offsets=offsets, size=stat.st_size, mtime=stat.st_mtime_ns, quote=quote)
+    except OSError:
+        pass  # Read-only location, the index is rebuilt next time
+
+
+class LargeCsvFile:
+    # Read-only, random-access view of a CSV that is never loaded as a whole.
+    # Rows are parsed in blocks on demand and a few recent blocks are kept.
+    # The byte-level row index needs an ASCII-compatible encoding.
+    read_only = True
+
+    def __init__(self, path, fmt=DEFAULT_FORMAT, block_rows=256, cached_blocks=64, sample_rows=1000):
+        if not ascii_compatible(fmt):
+            raise ValueError(f'Large files can only be opened in ASCII-compatible encodings, not {fmt.encoding}')
+        self.path = path
+        self.fmt = fmt
+        self.encoding = 'utf-8' if fmt.encoding == 'utf-8-sig' else fmt.encoding
+        self.headers = None
+        self.block_rows = block_rows
+        self.cached_blocks = cached_blocks
+        self.blocks = OrderedDict()
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        quote = ord(fmt.quotechar)
+        offsets = load_row_index(path, quote)
+        if offsets is None:
+            offsets = build_row_index(self.mm, quote=quote) if size else np.zeros(1, dtype=np.int64)
+            save_row_index(path, offsets, quote)
+        self.offsets = offsets
+        self.row_count = len(offsets) - 1
+        self.column_count = 0
+        if fmt.has_header and self.row_count:
+            self.headers = self.rows(0, 1)[0]
+            self.offsets = offsets[1:]
+            self.row_count -= 1
+        for row in self.rows(0, min(sample_rows, self.row_count)):
+            self.column_count = max(self.column_count, len(row))
+
+    def close(self):
+        self.blocks.clear()
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
+
+    def rows(self, start, stop):
+        # Parses rows [start, stop) straight from the mapped bytes
+        raw = self.mm[self.offsets[start]:self.offsets[stop]]
+        text = raw.decode(self.encoding, errors='replace').lstrip('\ufeff')
+        rows = list(csv.reader(io.StringIO(text, newline=''), delimiter=self.fmt.delimiter, quotechar=self.fmt.quotechar))
+        self.column_count = max([self.column_count] + [len(row) for row in rows])
+        return rows
+
+    def row(self, row):
+        block_number = row // self.block_rows
+        block = self.blocks.get(block_number)
+        if block is None:
+            start = block_number * self.block_rows
+            block = self.rows(start, min(start + self.block_rows, self.row_count))
+            self.blocks[block_number] = block
+            if len(self.blocks) > self.cached_blocks:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block_number)
+        offset = row - block_number * self.block_rows
+        return block[offset] if offset < len(block) else []
+
+    def cell(self, row, col):
+        if row >= self.row_count:
+            return ''
+        values = self.row(row)
+        return values[col] if col < len(values) else ''
+
+    def clamp(self, top, left, bottom, right):
+        return top, left, min(bottom, self.row_count - 1), right
+
+    def block(self, top, left, bottom, right):
+        rows = []
+        for values in self.rows(top, bottom + 1):
+            values = values[left:right + 1]
+            rows.append(values + [''] * (right - left + 1 - len(values)))
+        return rows
+
+    def columns_block(self, top, left, bottom, right):
+        # Same rectangle as a list of columns of texts, as SheetData gives it
+        rows = self.block(top, left, bottom, right)
+        return [list(texts) for texts in zip(*rows)] if rows else [[] for _ in range(right - left + 1)]
+
+    def columns_at(self, rows, left, right):
+        return [[self.cell(int(row), col) for row in rows] for col in range(left, right + 1)]
+
+    def extent(self):
+        return self.row_count, self.column_count
+
+    def iter_rows(self, start=0, stop=None, batch_size=10000, column_count=None):
+        # Rows are yielded as parsed, column_count is only a SheetData concern
+        stop = self.row_count if stop is None else stop
+        for batch_start in range(start, stop, batch_size):
+            yield from self.rows(batch_start, min(batch_start + batch_size, stop))
+
+    def numeric_chunks(self, rows, left, right):
+        top, bottom = rows.start, min(rows.stop, self.row_count) - 1
+        for start in range(top, bottom + 1, 100000):
+            rows = self.block(start, left, min(start + 99999, bottom), right)
+            for texts in zip(*rows):
+                yield np.asarray(pd.to_numeric(np.array(texts, dtype=object), errors='coerce'), dtype=np.float64)
+
+    def versions(self, left, right):
+        # The file never changes under this view
+        return ()
@@ -0,0 +1,21 @@
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    # Stand-in for a module that is only imported on first attribute access,
+    # so NumPy and pandas cost nothing at startup until a sheet needs them.
+    # The import system's own locks make the first access safe from workers.
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(name):
+    return name in sys.modules
@@ -3,7 +3,6 @@ import sys
 from PyQt5.QtWidgets import QMainWindow, QApplication, QTableWidget, QTableWidgetItem, QVBoxLayout, QPushButton, QFileDialog, QAction, QMenu, QWidget, QUndoStack , QUndoCommand , QShortcut , QMessageBox  
 from PyQt5.QtGui import  QKeySequence
 from PyQt5.QtCore import Qt
-import pandas as pd
 
 ### Easy CSV -table only-  v1.0 --- by Berk ÇIKIKCI --- don't forget to follow on Linkedin for further projects ----  ###
 
@@ -88,6 +87,7 @@ class App(QMainWindow):
 
         if file_name:
             try:
+                import pandas as pd  # only needed here, keeps startup fast
                 self.csv_data = pd.read_csv(file_name)
                 self.csv_loaded = True
             except Exception as e:
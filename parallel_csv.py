@@ -0,0 +1,155 @@
+import codecs
+import csv
+import io
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dialects import DEFAULT_FORMAT, ascii_compatible
+from lazy_imports import lazy_import
+from sheet_data import SheetData, infer_column, read_csv
+
+np = lazy_import('numpy')
+
+# Multi-process CSV parsing. The file is cut into byte ranges that end on
+# record boundaries, each range is parsed into typed Columns in a worker
+# process and the chunks are handed back in file order.
+#
+# A newline ends a record when an even number of quotes precede it, the
+# same rule build_row_index uses. Quote counts add up, so workers first
+# count the quotes in their range in parallel and the parity at every cut
+# point follows from a running sum. The rule agrees with the csv module as
+# long as every quote that opens a field follows a delimiter, a line break
+# or a closing quote; a file with a quote inside an unquoted field (ab"c)
+# is read sequentially instead.
+
+PARALLEL_MIN_BYTES = 32 << 20
+
+
+def process_pool(workers=None):
+    # spawn, because forking a process that runs Qt threads is not safe
+    return ProcessPoolExecutor(workers or os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
+
+def read_range(path, start, stop):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        return file.read(stop - start)
+
+
+def count_quotes(path, start, stop, fmt=DEFAULT_FORMAT):
+    # Quote count in bytes [start, stop), plus whether a quote would open a
+    # field in the wrong place if the range starts outside (index 1) or
+    # inside (index 2) a quoted field
+    field_starts = np.frombuffer((fmt.delimiter + '\r\n' + fmt.quotechar).encode('ascii'), dtype=np.uint8)
+    data = np.frombuffer(read_range(path, max(start - 1, 0), stop), dtype=np.uint8)
+    if not start:
+        data = np.concatenate([field_starts[:1], data])
+    quotes = np.flatnonzero(data[1:] == ord(fmt.quotechar)) + 1
+    misplaced = ~np.isin(data[quotes - 1], field_starts)
+    return len(quotes), bool(misplaced[0::2].any()), bool(misplaced[1::2].any())
+
+
+def next_boundary(path, position, in_quotes, size, quote=ord('"'), block_size=1 << 20):
+    # First offset after position where a record starts, given the quote
+    # parity of the bytes before position
+    with open(path, 'rb') as file:
+        file.seek(position)
+        while position < size:
+            block = np.frombuffer(file.read(block_size), dtype=np.uint8)
+            parity = (np.cumsum(block == quote, dtype=np.uint8) + in_quotes) & 1
+            ends = np.flatnonzero((block == ord('\n')) & (parity == 0))
+            if len(ends):
+                return position + int(ends[0]) + 1
+            in_quotes = parity[-1]
+            position += len(block)
+    return size
+
+
+def plan_ranges(path, executor, fmt=DEFAULT_FORMAT, start=0, chunk_bytes=64 << 20, first_chunk_bytes=1 << 20):
+    # Byte ranges [start, stop) from record start `start` on that each hold
+    # whole records, or None when the quoting is too loose for the parity
+    # rule. The first range is small so the first rows show up quickly.
+    size = os.path.getsize(path)
+    cuts = sorted({start, size, *range(min(start + first_chunk_bytes, size), size, chunk_bytes)})
+    spans = list(zip(cuts[:-1], cuts[1:]))
+    counts = list(executor.map(count_quotes, itertools.repeat(path), *zip(*spans), itertools.repeat(fmt))) if spans else []
+    in_quotes = 0
+    parities = []
+    for count, misplaced_outside, misplaced_inside in counts:
+        if misplaced_inside if in_quotes else misplaced_outside:
+            return None
+        parities.append(in_quotes)
+        in_quotes = (in_quotes + count) & 1
+    bounds = [start]
+    for cut, parity in zip(cuts[1:-1], parities[1:]):
+        if cut >= bounds[-1]:
+            bounds.append(next_boundary(path, cut, np.uint8(parity), size, ord(fmt.quotechar)))
+    bounds = sorted(set(bounds + [size]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def decode_rows(raw, fmt, at_start):
+    encoding = fmt.encoding
+    if not at_start and codecs.lookup(encoding).name == 'utf-8-sig':
+        encoding = 'utf-8'  # only the start of the file can hold a BOM
+    return list(csv.reader(io.StringIO(raw.decode(encoding), newline=''), delimiter=fmt.delimiter, quotechar=fmt.quotechar))
+
+
+def read_header(path, fmt=DEFAULT_FORMAT):
+    # (header row, offset of the first data record), or None when a quote in
+    # the header doesn't start or end a field, so quote parity can't find
+    # where the header ends
+    stop = next_boundary(path, 0, np.uint8(0), os.path.getsize(path), ord(fmt.quotechar))
+    if count_quotes(path, 0, stop, fmt)[1]:
+        return None
+    rows = decode_rows(read_range(path, 0, stop), fmt, True)
+    return (rows[0] if rows else []), stop
+
+
+def parse_range(path, start, stop, fmt=DEFAULT_FORMAT):
+    # (row count, typed Columns) for the records in bytes [start, stop)
+    rows = decode_rows(read_range(path, start, stop), fmt, not start)
+    columns = [infer_column(np.array(texts, dtype=object)) for texts in itertools.zip_longest(*rows, fillvalue='')]
+    return len(rows), columns
+
+
+def parse_ranges(path, ranges, executor, fmt=DEFAULT_FORMAT, ahead=None):
+    # Yields (row_count, columns, bytes_read, total_bytes) in file order with
+    # at most `ahead` ranges in flight, so a slow consumer bounds memory.
+    # Closing the generator early cancels whatever has not started yet.
+    size = os.path.getsize(path)
+    ahead = ahead or 2 * (os.cpu_count() or 1)
+    ranges = iter(ranges)
+    pending = [(stop, executor.submit(parse_range, path, start, stop, fmt))
+               for start, stop in itertools.islice(ranges, ahead)]
+    try:
+        while pending:
+            stop, future = pending.pop(0)
+            row_count, columns = future.result()
+            for start, next_stop in itertools.islice(ranges, 1):
+                pending.append((next_stop, executor.submit(parse_range, path, start, next_stop, fmt)))
+            yield row_count, columns, stop, size
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def can_parse_parallel(path, fmt=DEFAULT_FORMAT, min_bytes=PARALLEL_MIN_BYTES):
+    return os.path.getsize(path) >= min_bytes and ascii_compatible(fmt) and (os.cpu_count() or 1) > 1
+
+
+def read_csv_parallel(path, fmt=DEFAULT_FORMAT, workers=None):
+    # Whole file into a SheetData using every core, or sequentially when the
+    # file can't be split safely
+    if ascii_compatible(fmt):
+        with process_pool(workers) as executor:
+            header = read_header(path, fmt) if fmt.has_header else (None, 0)
+            ranges = plan_ranges(path, executor, fmt, header[1]) if header is not None else None
+            if ranges is not None:
+                sheet = SheetData(headers=header[0])
+                for row_count, columns, _, _ in parse_ranges(path, ranges, executor, fmt):
+                    sheet.append_columns(row_count, columns)
+                return sheet
+    return read_csv(path, fmt)
@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+# Timing and memory of the window's hot paths, for when "it froze" needs a
+# closer look. Code marks work with `with RECORDER.span(name):`, or keeps
+# the span and calls finish() where the work ends, e.g. in the slot an
+# import's worker signals at the end. Each finished span is kept with its
+# duration, cell count and peak RSS. The window feeds heartbeat() from a
+# timer; a gap much longer than the timer interval is recorded as a stall
+# of the GUI thread. Events are shown by the window's overlay and saved as
+# a Chrome trace (chrome://tracing, Perfetto).
+#
+# Recording is off unless EASYCSV_PERF is set or the overlay is turned on;
+# a span is then a shared no-op object, so the instrumented code pays one
+# attribute check.
+
+STALL_MS = 200
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS
+
+
+class Span:
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.start = time.perf_counter()
+        self.start_rss = peak_rss_kb()
+
+    def finish(self, **args):
+        self.args.update(args)
+        self.recorder.record(self.name, self.start, time.perf_counter() - self.start, self.args, self.start_rss)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+
+
+class NullSpan:
+    # What spans are while recording is off
+    def finish(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Recorder:
+    # The last `capacity` events, each (name, start, duration, args, thread)
+    # with times in seconds on the perf_counter clock
+    def __init__(self, capacity=10000, stall_ms=STALL_MS, enabled=False):
+        self.enabled = enabled
+        self.stall_ms = stall_ms
+        self.events = deque(maxlen=capacity)
+        self.origin = time.perf_counter()
+        self.last_beat = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.last_beat = None
+
+    def span(self, name, **args):
+        return Span(self, name, args) if self.enabled else NULL_SPAN
+
+    def record(self, name, start, duration, args, start_rss=None):
+        rss = peak_rss_kb()
+        if rss is not None:
+            args['peak_rss_kb'] = rss
+            if start_rss is not None and rss > start_rss:
+                args['peak_rss_growth_kb'] = rss - start_rss
+        self.events.append((name, start, duration, args, threading.current_thread().name))
+
+    def heartbeat(self, interval_ms):
+        # Called by a repeating timer on the GUI thread; a late call means the
+        # thread was busy for the whole gap
+        now = time.perf_counter()
+        last, self.last_beat = self.last_beat, now
+        if last is not None and 1000 * (now - last) - interval_ms > self.stall_ms:
+            self.record('stall', last, now - last, {})
+
+    def clear(self):
+        self.events.clear()
+
+    def stalls(self):
+        return [event for event in self.events if event[0] == 'stall']
+
+    def chrome_trace(self):
+        # Complete ('X') events in microseconds, one track per thread
+        threads = {}
+        events = []
+        for name, start, duration, args, thread in self.events:
+            tid = threads.setdefault(thread, len(threads) + 1)
+            events.append({'name': name, 'cat': 'stall' if name == 'stall' else 'easycsv', 'ph': 'X',
+                           'ts': round(1e6 * (start - self.origin), 1), 'dur': round(1e6 * duration, 1),
+                           'pid': os.getpid(), 'tid': tid, 'args': args})
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': thread}}
+                   for thread, tid in threads.items()]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+def format_event(event):
+    name, _, duration, args, _ = event
+    details = ''.join(f'  {key}={value}' for key, value in args.items() if key != 'peak_rss_kb')
+    return f'{name:<18}{1000 * duration:9.1f} ms{details}'
+
+
+def format_overlay(recorder, count=12):
+    # Newest events first, below a line of totals
+    stalls = recorder.stalls()
+    rss = peak_rss_kb()
+    lines = [f"Peak RSS {rss / 1024:.0f} MB" if rss is not None else 'Peak RSS n/a',
+             f'Stalls > {recorder.stall_ms} ms: {len(stalls)}' + (f' (longest {1000 * max(s[2] for s in stalls):.0f} ms)' if stalls else '')]
+    lines += [format_event(event) for event in list(recorder.events)[-count:][::-1]]
+    return '\n'.join(lines)
+
+
+RECORDER = Recorder(enabled=bool(os.environ.get('EASYCSV_PERF')))
@@ -0,0 +1,247 @@
+import warnings
+import weakref
+from collections import OrderedDict, namedtuple
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Per-column derived data, dropped with the column and rebuilt when its version moves on
+_codes_cache = weakref.WeakKeyDictionary()
+_order_cache = weakref.WeakKeyDictionary()
+_multi_order_cache = OrderedDict()
+
+
+def _sort_keys(column, n):
+    # Comparable keys for the first n cells and the null mask. Text columns
+    # whose cells all read as numbers sort numerically.
+    values = column.values[:n]
+    null = values == '' if column.mask is None else column.mask[:n]
+    if column.kind == 'category':
+        ranks = np.unique(column.spec, return_inverse=True)[1]
+        return ranks[values], null
+    if column.kind == 'datetime':
+        return values.view(np.int64), null
+    if column.mask is None:
+        numeric = column.numeric()[:n]
+        if not np.isnan(numeric[~null]).any():
+            return numeric, null
+    return values, null
+
+
+def sort_codes(column, length):
+    # Dense ranks of the column's values over `length` rows: equal values share
+    # a code and empty cells (or rows past the column's end) get the largest
+    cached = _codes_cache.get(column)
+    if cached is not None and cached[0] == column.version and cached[1] == length:
+        return cached[2], cached[3]
+    n = min(column.length, length)
+    keys, null = _sort_keys(column, n)
+    filled = np.flatnonzero(~null)
+    uniques, inverse = np.unique(keys[filled], return_inverse=True)
+    null_code = len(uniques)
+    codes = np.full(length, null_code, dtype=np.int64)
+    codes[filled] = inverse
+    _codes_cache[column] = (column.version, length, codes, null_code)
+    return codes, null_code
+
+
+def _reverse_groups(order, codes, null_code):
+    # Descending order from the ascending one in O(n): runs of equal keys swap
+    # places but keep their rows in original order, and empty cells stay last
+    sorted_codes = codes[order]
+    n_filled = int(np.searchsorted(sorted_codes, null_code))
+    result = order.copy()
+    if not n_filled:
+        return result
+    filled_codes = sorted_codes[:n_filled]
+    starts = np.flatnonzero(np.r_[True, filled_codes[1:] != filled_codes[:-1]])
+    lengths = np.diff(np.r_[starts, n_filled])
+    group = np.repeat(np.arange(len(starts)), lengths)
+    new_starts = np.cumsum(np.r_[0, lengths[::-1][:-1]])[::-1]
+    positions = new_starts[group] + np.arange(n_filled) - starts[group]
+    result[positions] = order[:n_filled]
+    return result
+
+
+def column_order(column, length, ascending=True):
+    # Stable permutation of the rows sorted by one column, cached per direction
+    # until the column changes, so toggling the direction is instant
+    cached = _order_cache.get(column)
+    if cached is None or cached[0] != column.version or cached[1] != length:
+        cached = (column.version, length, {})
+        _order_cache[column] = cached
+    orders = cached[2]
+    if ascending not in orders:
+        codes, null_code = sort_codes(column, length)
+        if True in orders:
+            orders[ascending] = _reverse_groups(orders[True], codes, null_code)
+        else:
+            orders[True] = np.argsort(codes, kind='stable')
+            if not ascending:
+                orders[False] = _reverse_groups(orders[True], codes, null_code)
+    return orders[ascending]
+
+
+def sort_order(sheet, keys, cache_size=8):
+    # Stable row permutation for keys [(col, ascending), ...], first key major.
+    # Nothing is moved: the result is a view order over the untouched columns.
+    length = sheet.row_count
+    keys = [(col, ascending) for col, ascending in keys if col < sheet.column_count]
+    if not keys:
+        return np.arange(length)
+    if len(keys) == 1:
+        col, ascending = keys[0]
+        return column_order(sheet.columns[col], length, ascending)
+
+    cache_key = (id(sheet), length, tuple(keys), tuple(sheet.columns[col].version for col, _ in keys))
+    if cache_key in _multi_order_cache:
+        _multi_order_cache.move_to_end(cache_key)
+        return _multi_order_cache[cache_key]
+    lex_keys = []
+    for col, ascending in reversed(keys):
+        codes, null_code = sort_codes(sheet.columns[col], length)
+        if not ascending:
+            codes = np.where(codes == null_code, null_code, null_code - 1 - codes)
+        lex_keys.append(codes)
+    order = np.lexsort(lex_keys)
+    _multi_order_cache[cache_key] = order
+    if len(_multi_order_cache) > cache_size:
+        _multi_order_cache.popitem(last=False)
+    return order
+
+
+Filter = namedtuple('Filter', 'col op value value2')
+FILTER_OPS = ('equals', 'contains', 'range', 'regex')
+
+_value_index_cache = weakref.WeakKeyDictionary()
+_range_index_cache = weakref.WeakKeyDictionary()
+_text_match_cache = weakref.WeakKeyDictionary()
+
+
+def _text_codes(column, length):
+    # Codes of a text column's exact texts, as sort_codes gives them otherwise.
+    # sort_codes ranks text that reads as numbers by value, which would make
+    # '1', '1.0' and '01' equal.
+    n = min(column.length, length)
+    values = column.values[:n]
+    filled = np.flatnonzero(values != '')
+    uniques, inverse = np.unique(values[filled], return_inverse=True)
+    codes = np.full(length, len(uniques), dtype=np.int64)
+    codes[filled] = inverse
+    return codes, len(uniques), uniques.tolist()
+
+
+def value_index(column, length):
+    # Equality index: a dict from each distinct text to its code, plus the rows
+    # grouped by code (ascending within a group). Typed columns reuse the
+    # cached sort order, whose equal values are equal texts.
+    cached = _value_index_cache.get(column)
+    if cached is not None and cached[0] == column.version and cached[1] == length:
+        return cached[2]
+    if column.mask is None:
+        codes, null_code, texts = _text_codes(column, length)
+        order = np.argsort(codes, kind='stable')
+    else:
+        codes, null_code = sort_codes(column, length)
+        order = column_order(column, length, True)
+    starts = np.searchsorted(codes[order], np.arange(null_code + 2))
+    if column.mask is not None:
+        texts = column.take_at(order[starts[:null_code]])
+    index = (dict(zip(texts, range(null_code))), order, starts, null_code)
+    _value_index_cache[column] = (column.version, length, index)
+    return index
+
+
+def equal_rows(column, length, text):
+    lookup, order, starts, null_code = value_index(column, length)
+    code = null_code if text == '' else lookup.get(text)
+    if code is None:
+        return np.empty(0, dtype=np.int64)
+    return order[starts[code]:starts[code + 1]]
+
+
+def range_index(column, length):
+    # Sorted numeric values and their rows; non-numeric cells sort last as NaN
+    cached = _range_index_cache.get(column)
+    if cached is not None and cached[0] == column.version and cached[1] == length:
+        return cached[2], cached[3]
+    numeric = np.full(length, np.nan)
+    values = column.numeric()[:length]
+    numeric[:len(values)] = values
+    order = np.argsort(numeric, kind='stable')
+    sorted_values = numeric[order]
+    _range_index_cache[column] = (column.version, length, sorted_values, order)
+    return sorted_values, order
+
+
+def range_rows(column, length, low=None, high=None):
+    sorted_values, order = range_index(column, length)
+    start = 0 if low is None else np.searchsorted(sorted_values, low, 'left')
+    stop = int(np.count_nonzero(~np.isnan(sorted_values))) if high is None else np.searchsorted(sorted_values, high, 'right')
+    return np.sort(order[start:stop])
+
+
+def text_match(column, length, pattern, regex=False, cache_size=8):
+    # Boolean mask of cells containing pattern (or matching the regex).
+    # Category columns test each distinct text once.
+    cache = _text_match_cache.get(column)
+    if cache is None or cache[0] != column.version or cache[1] != length:
+        cache = (column.version, length, OrderedDict())
+        _text_match_cache[column] = cache
+    results, key = cache[2], (pattern, regex)
+    if key in results:
+        results.move_to_end(key)
+        return results[key]
+
+    n = min(column.length, length)
+    matches = np.zeros(length, dtype=bool)
+    with warnings.catch_warnings():
+        # pandas warns about match groups, which only matter to replace_texts
+        warnings.simplefilter('ignore', UserWarning)
+        if column.kind == 'category':
+            hits = pd.Series(column.spec, dtype=object).str.contains(pattern, regex=regex, na=False).to_numpy(dtype=bool)
+            matches[:n] = hits[column.values[:n]] & ~column.mask[:n]
+        elif n:
+            texts = pd.Series(column.format(slice(0, n)), dtype=object)
+            matches[:n] = texts.str.contains(pattern, regex=regex, na=False).to_numpy(dtype=bool)
+    results[key] = matches
+    if len(results) > cache_size:
+        results.popitem(last=False)
+    return matches
+
+
+def matching_rows(sheet, col, op, value, value2=None):
+    # Ascending sheet rows whose cell in col satisfies the predicate
+    length = sheet.row_count
+    if col >= sheet.column_count:
+        return np.arange(length) if op == 'equals' and value == '' else np.empty(0, dtype=np.int64)
+    column = sheet.columns[col]
+    if op == 'equals':
+        return equal_rows(column, length, value)
+    if op == 'range':
+        low = float(value) if value != '' else None
+        high = float(value2) if value2 not in (None, '') else None
+        return range_rows(column, length, low, high)
+    if op in ('contains', 'regex'):
+        return np.flatnonzero(text_match(column, length, value, op == 'regex'))
+    raise ValueError(f'Unknown filter operator: {op}')
+
+
+def filter_mask(sheet, filters):
+    # Rows passing every filter, as a boolean mask over the sheet's rows
+    mask = np.ones(sheet.row_count, dtype=bool)
+    for f in filters:
+        keep = np.zeros(sheet.row_count, dtype=bool)
+        keep[matching_rows(sheet, f.col, f.op, f.value, f.value2)] = True
+        mask &= keep
+    return mask
+
+
+def replace_texts(texts, op, find, replacement):
+    # New texts for cells matched by matching_rows(..., op, find)
+    if op == 'equals':
+        return [replacement] * len(texts)
+    series = pd.Series(texts, dtype=object)
+    return series.str.replace(find, replacement, regex=op == 'regex').tolist()
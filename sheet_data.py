@@ -0,0 +1,605 @@
+import csv
+import gzip
+import io
+import itertools
+import os
+import re
+
+from dialects import DEFAULT_FORMAT
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+BOOL_SPELLINGS = (('False', 'True'), ('false', 'true'), ('FALSE', 'TRUE'))
+DATETIME_PREFIX = re.compile(r'\d{4}-\d{2}-\d{2}')
+CATEGORY_MIN_ROWS = 16
+# Prints whole numbers without a '.0' and short decimals as typed, so a
+# column can hold both as float (0.1 + 0.2 shows as 0.3)
+FLOAT_SPEC = '%.15g'
+
+
+def _format(kind, spec, values):
+    # Texts for typed values, exactly as they were read
+    if kind == 'int':
+        return values.astype(str)
+    if kind == 'float':
+        return values.astype(str) if spec is None else np.char.mod(spec, values)
+    if kind == 'bool':
+        return np.where(values, spec[1], spec[0])
+    if kind == 'datetime':
+        texts = np.datetime_as_string(values)
+        return np.char.replace(texts, 'T', ' ') if spec == ' ' else texts
+    if kind == 'category':
+        return spec[values]
+    return values
+
+
+def _parse(kind, spec, texts, dtype='datetime64'):
+    # Typed values for non-empty texts, or None when any of them cannot be
+    # stored as this kind without changing how it reads back. dtype fixes the
+    # datetime unit once a column has one.
+    try:
+        if kind == 'int':
+            values = texts.astype(np.int64)
+        elif kind == 'float':
+            values = texts.astype(np.float64)
+        elif kind == 'bool':
+            values = texts == spec[1]
+            if not (values | (texts == spec[0])).all():
+                return None
+            return values
+        elif kind == 'datetime':
+            values = np.array(texts.astype(str), dtype=dtype)
+        else:
+            return None
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if not (_format(kind, spec, values) == texts).all():
+        return None
+    return values
+
+
+def _grown(buffer, used, length, dtype):
+    # buffer with room for length items and its first `used` kept, grown by
+    # doubling so a column that keeps growing is not copied on every append
+    if buffer is not None and len(buffer) >= length:
+        return buffer
+    grown = np.empty(max(length, 2 * len(buffer) if buffer is not None else 0), dtype=dtype)
+    if buffer is not None:
+        grown[:used] = buffer[:used]
+    return grown
+
+
+def infer_column(texts):
+    # Picks the most compact kind that reproduces every text: int, float,
+    # bool, datetime, dictionary-encoded category, or plain str
+    texts = np.asarray(texts, dtype=object)
+    mask = texts == ''
+    filled = texts[~mask]
+    if not len(filled):
+        return Column(None, texts)
+    first = filled[0]
+
+    candidates = [('int', None), ('float', None)]
+    if '.' in first and 'e' not in first.lower():
+        candidates.append(('float', f'%.{len(first) - first.index(".") - 1}f'))
+    candidates += [('bool', spelling) for spelling in BOOL_SPELLINGS if first in spelling]
+    if DATETIME_PREFIX.match(first):
+        candidates.append(('datetime', ' ' if ' ' in first else 'T'))
+    for kind, spec in candidates:
+        values = _parse(kind, spec, filled)
+        if values is not None:
+            column = Column(kind, np.zeros(len(texts), dtype=values.dtype), mask, spec)
+            column.values[~mask] = values
+            return column
+
+    codes, categories = pd.factorize(filled)
+    if len(texts) >= CATEGORY_MIN_ROWS and 2 * len(categories) <= len(texts):
+        column = Column('category', np.zeros(len(texts), dtype=np.int32), mask, np.asarray(categories, dtype=object))
+        column.values[~mask] = codes
+        return column
+    return Column('str', texts)
+
+
+class Column:
+    # One column in typed NumPy storage. kind is 'int', 'float', 'bool',
+    # 'datetime', 'category' (int32 codes into spec, the category texts),
+    # 'str' (an object array where '' marks an empty cell) or None while the
+    # column holds no text yet. Typed kinds keep a null mask next to the
+    # values; spec holds what is needed to print a value back exactly as it
+    # was read. Arrays are over-allocated so appending does not always copy.
+    def __init__(self, kind=None, values=None, mask=None, spec=None):
+        if values is None:
+            values = np.empty(0, dtype=object)
+        self.kind = kind
+        self.values = values
+        self.mask = mask
+        self.spec = spec
+        self.length = len(values)
+        self.category_index = None
+        # Bumped on every edit so derived data (numeric cache, stats) can be
+        # reused. edit_version only moves when rows that were already there
+        # change, so data derived row by row can be extended after an append.
+        self.version = 0
+        self.edit_version = 0
+        self.numeric_cache = None
+        self.prefix_cache = None
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, length):
+        # Room for length rows. Read-only values (mapped from an Arrow file)
+        # are copied here, before the first write into them.
+        if length <= len(self.values) and self.values.flags.writeable:
+            return
+        capacity = max(length, 2 * len(self.values), 16) if length > len(self.values) else len(self.values)
+        grown = np.zeros(capacity, dtype=self.values.dtype)
+        grown[:self.length] = self.values[:self.length]
+        self.values = grown
+        if self.mask is not None:
+            mask = np.ones(capacity, dtype=bool)
+            mask[:self.length] = self.mask[:self.length]
+            self.mask = mask
+
+    def format(self, index):
+        # Texts of the cells at index, a slice or an array of rows within the column
+        values = self.values[index]
+        if self.mask is None:
+            return values
+        texts = _format(self.kind, self.spec, values).astype(object)
+        texts[self.mask[index]] = ''
+        return texts
+
+    def get(self, row):
+        if row >= self.length:
+            return ''
+        return self.format(slice(row, row + 1))[0]
+
+    def take(self, start, stop):
+        texts = self.format(slice(start, min(stop, self.length))).tolist()
+        if len(texts) < stop - start:
+            texts.extend([''] * (stop - start - len(texts)))
+        return texts
+
+    def take_at(self, rows):
+        # Texts for an array of (possibly unordered) rows
+        texts = np.full(len(rows), '', dtype=object)
+        inside = rows < self.length
+        texts[inside] = self.format(rows[inside])
+        return texts.tolist()
+
+    def subset(self, rows):
+        # New column holding the cells at an array of rows, in that order,
+        # without going through text; rows past the end come out empty. Text
+        # is inferred again, e.g. a numeric column below a header row.
+        inside = rows < self.length
+        if self.mask is None:
+            values = np.full(len(rows), '', dtype=object)
+            values[inside] = self.values[rows[inside]]
+            return infer_column(values)
+        values = np.zeros(len(rows), dtype=self.values.dtype)
+        values[inside] = self.values[rows[inside]]
+        mask = np.ones(len(rows), dtype=bool)
+        mask[inside] = self.mask[rows[inside]]
+        return Column(self.kind, values, mask, self.spec)
+
+    def to_pandas(self):
+        # Typed values for a DataFrame column: nullable arrays where cells are
+        # empty, categories stay categorical, text columns keep '' for empty
+        values = self.values[:self.length]
+        if self.mask is None:
+            return values
+        mask = self.mask[:self.length]
+        if self.kind == 'category':
+            return pd.Categorical.from_codes(np.where(mask, -1, values), categories=self.spec)
+        if not mask.any():
+            return values
+        if self.kind == 'int':
+            return pd.arrays.IntegerArray(values, mask)
+        if self.kind == 'bool':
+            return pd.arrays.BooleanArray(values, mask)
+        values = values.copy()
+        values[mask] = np.datetime64('NaT') if self.kind == 'datetime' else np.nan
+        return values
+
+    def encode(self, texts):
+        # (values, mask) for texts in this column's kind, None if it must change
+        mask = texts == ''
+        if self.kind == 'str' or (self.kind is None and mask.all()):
+            return texts, None
+        if self.kind is None:
+            return None
+        values = np.zeros(len(texts), dtype=self.values.dtype)
+        filled = texts[~mask]
+        if self.kind == 'category':
+            if self.category_index is None:
+                self.category_index = pd.Index(self.spec)
+            codes = self.category_index.get_indexer(filled)
+            if (codes < 0).any():
+                added = pd.unique(filled[codes < 0])
+                if 2 * (len(self.spec) + len(added)) > max(self.length + len(texts), CATEGORY_MIN_ROWS):
+                    return None
+                self.spec = np.concatenate([self.spec, np.asarray(added, dtype=object)])
+                self.category_index = pd.Index(self.spec)
+                codes = self.category_index.get_indexer(filled)
+            values[~mask] = codes
+            return values, mask
+        parsed = _parse(self.kind, self.spec, filled, self.values.dtype)
+        if parsed is None:
+            return None
+        values[~mask] = parsed
+        return values, mask
+
+    def widened(self, texts):
+        # A float copy of an int or float column that also holds the numbers
+        # in texts, printed with FLOAT_SPEC; None when a stored cell or one
+        # of the texts would read back differently that way
+        if self.kind not in ('int', 'float') or _parse('float', FLOAT_SPEC, texts[texts != '']) is None:
+            return None
+        values, mask = self.values[:self.length], self.mask[:self.length]
+        filled = values[~mask]
+        if self.kind == 'int':
+            if (np.abs(filled) >= 10 ** 15).any():
+                return None  # more digits than FLOAT_SPEC prints
+        elif self.spec != FLOAT_SPEC and not (_format('float', FLOAT_SPEC, filled) == _format('float', self.spec, filled)).all():
+            return None
+        return Column('float', values.astype(np.float64), mask.copy(), FLOAT_SPEC)
+
+    def changed(self, first_row):
+        self.version += 1
+        if first_row < self.length:
+            self.edit_version += 1
+
+    def assign(self, other):
+        # Takes over all cells of another column, e.g. a re-inferred or
+        # computed one
+        self.changed(0)
+        self.kind, self.values, self.mask, self.spec = other.kind, other.values, other.mask, other.spec
+        self.length = other.length
+        self.category_index = None
+
+    def put(self, rows, texts):
+        # Writes texts from row `rows` down, or into the rows of an index array
+        texts = np.asarray(texts, dtype=object)
+        if isinstance(rows, np.ndarray):
+            index, stop = rows, int(rows.max()) + 1 if len(rows) else 0
+            first = int(rows.min()) if len(rows) else stop
+        else:
+            index, stop = slice(rows, rows + len(texts)), rows + len(texts)
+            first = rows
+        encoded = self.encode(texts)
+        if encoded is None:
+            # A decimal in an int column, or a whole number in a float column
+            # that prints every value in full, makes it a float column
+            widened = self.widened(texts)
+            if widened is not None:
+                self.assign(widened)
+                encoded = self.encode(texts)
+        if encoded is None:
+            # The new texts don't fit: re-infer the whole column from its texts
+            all_texts = np.asarray(self.take(0, max(self.length, stop)), dtype=object)
+            all_texts[index] = texts
+            return self.assign(infer_column(all_texts))
+
+        self.reserve(stop)
+        if stop > self.length:
+            if self.mask is None:
+                self.values[self.length:stop] = ''
+            else:
+                self.mask[self.length:stop] = True
+        values, mask = encoded
+        self.values[index] = values
+        if mask is not None:
+            self.mask[index] = mask
+        self.changed(first)
+        self.length = max(self.length, stop)
+
+    def extend(self, other, start):
+        # Appends a column parsed elsewhere (e.g. in another process) at row
+        # start. Matching kinds are copied as arrays; anything else goes
+        # through put, which re-infers the column if it has to.
+        n = other.length
+        if not n:
+            return
+        if self.kind is None and other.kind is not None and self.last_filled() < 0:
+            # Nothing stored yet: take on the chunk's kind
+            self.changed(0)
+            self.kind, self.spec, self.length, self.category_index = other.kind, other.spec, 0, None
+            self.values = np.empty(0, dtype=other.values.dtype)
+            self.mask = None if other.mask is None else np.empty(0, dtype=bool)
+        values = other.values[:n]
+        if other.kind != self.kind or other.values.dtype != self.values.dtype:
+            return self.put(start, other.format(slice(0, n)))
+        if self.kind == 'category':
+            categories = pd.Index(self.spec).append(pd.Index(other.spec)).unique()
+            if 2 * len(categories) > max(start + n, CATEGORY_MIN_ROWS):
+                return self.put(start, other.format(slice(0, n)))
+            values = categories.get_indexer(other.spec).astype(np.int32)[values]
+            self.spec, self.category_index = np.asarray(categories, dtype=object), None
+        elif self.mask is not None and other.spec != self.spec:
+            return self.put(start, other.format(slice(0, n)))
+
+        stop = start + n
+        self.reserve(stop)
+        if self.mask is None:
+            self.values[self.length:start] = ''
+        else:
+            self.mask[self.length:start] = True
+            self.mask[start:stop] = other.mask[:n]
+        self.values[start:stop] = values
+        self.changed(start)
+        self.length = max(self.length, stop)
+
+    def set(self, row, text):
+        self.put(row, [text])
+
+    def numeric(self):
+        # float64 view of the column, NaN where a cell is empty or not a number.
+        # Typed columns convert directly; text is parsed once in C by pandas,
+        # categories only once per distinct value. Kept until the column is
+        # edited; rows appended since are converted on their own.
+        cached = self.numeric_cache
+        if cached is None or cached[0] != self.version:
+            done, buffer = (cached[2], cached[3]) if cached is not None and cached[1] == self.edit_version else (0, None)
+            buffer = _grown(buffer, done, self.length, np.float64)
+            buffer[done:self.length] = self.numeric_rows(done, self.length)
+            self.numeric_cache = cached = (self.version, self.edit_version, self.length, buffer)
+        return cached[3][:cached[2]]
+
+    def numeric_rows(self, start, stop):
+        values = self.values[start:stop]
+        if self.kind in ('int', 'float'):
+            numeric = values.astype(np.float64)
+            numeric[self.mask[start:stop]] = np.nan
+        elif self.kind == 'category':
+            numeric = np.asarray(pd.to_numeric(self.spec, errors='coerce'), dtype=np.float64)[values]
+            numeric[self.mask[start:stop]] = np.nan
+        elif self.mask is None:
+            numeric = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+        else:
+            numeric = np.full(stop - start, np.nan)
+        return numeric
+
+    def prefix_sums(self):
+        # Running sum and count of the numeric cells with a leading zero, so any
+        # row range [start, stop) totals in O(1): sums[stop] - sums[start].
+        # Appended rows only extend the running totals.
+        cached = self.prefix_cache
+        if cached is None or cached[0] != self.version:
+            numeric = self.numeric()
+            done, sums, counts = (cached[2], cached[3], cached[4]) if cached is not None and cached[1] == self.edit_version else (0, None, None)
+            sums = _grown(sums, done + 1, self.length + 1, np.float64)
+            counts = _grown(counts, done + 1, self.length + 1, np.int64)
+            if not done:
+                sums[0] = counts[0] = 0
+            tail = numeric[done:]
+            valid = ~np.isnan(tail)
+            appended = slice(done + 1, self.length + 1)
+            np.cumsum(np.where(valid, tail, 0.0), out=sums[appended])
+            sums[appended] += sums[done]
+            np.cumsum(valid, out=counts[appended])
+            counts[appended] += counts[done]
+            self.prefix_cache = cached = (self.version, self.edit_version, self.length, sums, counts)
+        return cached[3][:cached[2] + 1], cached[4][:cached[2] + 1]
+
+    def last_filled(self):
+        # Index of the last non-empty cell, -1 when the column is empty
+        if self.mask is None:
+            filled = np.flatnonzero(self.values[:self.length] != '')
+        else:
+            filled = np.flatnonzero(~self.mask[:self.length])
+        return int(filled[-1]) if len(filled) else -1
+
+
+class SheetData:
+    read_only = False
+
+    def __init__(self, columns=None, row_count=0, headers=None):
+        self.columns = columns if columns is not None else []
+        self.row_count = row_count
+        # Names from the file's header row, kept apart from the data
+        self.headers = headers
+
+    @classmethod
+    def from_rows(cls, rows):
+        sheet = cls()
+        sheet.append_rows(rows)
+        return sheet
+
+    @property
+    def column_count(self):
+        return len(self.columns)
+
+    def ensure_size(self, row_count, column_count):
+        while len(self.columns) < column_count:
+            self.columns.append(Column())
+        self.row_count = max(self.row_count, row_count)
+
+    def cell(self, row, col):
+        if col >= len(self.columns):
+            return ''
+        return self.columns[col].get(row)
+
+    def set_cell(self, row, col, text):
+        self.ensure_size(row + 1, col + 1)
+        self.columns[col].set(row, text)
+
+    def block(self, top, left, bottom, right):
+        # Returns the rectangle as a list of rows of texts
+        columns = self.columns_block(top, left, bottom, right)
+        return [list(row) for row in zip(*columns)] if columns else []
+
+    def columns_block(self, top, left, bottom, right):
+        # Same rectangle as a list of columns of texts
+        return [self.column_block(col, top, bottom + 1) for col in range(left, right + 1)]
+
+    def columns_at(self, rows, left, right):
+        # Columns of texts for an array of rows, e.g. a sorted view's rows
+        return [self.columns[col].take_at(rows) if col < len(self.columns) else [''] * len(rows)
+                for col in range(left, right + 1)]
+
+    def column_block(self, col, start, stop):
+        if col >= len(self.columns):
+            return [''] * (stop - start)
+        return self.columns[col].take(start, stop)
+
+    def set_block(self, top, left, rows):
+        if not rows:
+            return
+        self.set_columns(top, left, list(itertools.zip_longest(*rows, fillvalue='')))
+
+    def set_columns(self, rows, left, columns):
+        # rows is the top row of a contiguous block or an array of rows
+        if not columns:
+            return
+        stop = int(rows.max()) + 1 if isinstance(rows, np.ndarray) else rows + len(columns[0])
+        self.ensure_size(stop, left + len(columns))
+        for offset, texts in enumerate(columns):
+            self.columns[left + offset].put(rows, texts)
+
+    def clamp(self, top, left, bottom, right):
+        # Cuts a selection down to the part that can hold data
+        return top, left, min(bottom, self.row_count - 1), min(right, len(self.columns) - 1)
+
+    def append_rows(self, rows):
+        self.set_block(self.row_count, 0, rows)
+
+    def append_columns(self, row_count, columns):
+        # Appends row_count rows that were already parsed into Columns
+        start = self.row_count
+        self.ensure_size(start + row_count, len(columns))
+        for column, parsed in zip(self.columns, columns):
+            column.extend(parsed, start)
+
+    def extent(self):
+        # (rows, columns) actually holding data, ignoring trailing empty cells
+        last_row, column_count = -1, 0
+        for col, column in enumerate(self.columns):
+            last = column.last_filled()
+            if last >= 0:
+                last_row = max(last_row, last)
+                column_count = col + 1
+        return last_row + 1, column_count
+
+    def iter_rows(self, start=0, stop=None, batch_size=10000, column_count=None):
+        stop = self.row_count if stop is None else stop
+        columns = self.columns if column_count is None else self.columns[:column_count]
+        for batch_start in range(start, stop, batch_size):
+            batch_stop = min(batch_start + batch_size, stop)
+            yield from zip(*[column.take(batch_start, batch_stop) for column in columns])
+
+    def numeric_chunks(self, rows, left, right):
+        # One float64 slice per selected column, NaN for non-numeric cells.
+        # rows is a slice or an array of rows.
+        for col in range(left, min(right, len(self.columns) - 1) + 1):
+            numeric = self.columns[col].numeric()
+            yield numeric[rows] if isinstance(rows, slice) else numeric[rows[rows < len(numeric)]]
+
+    def versions(self, left, right):
+        return tuple(column.version for column in self.columns[left:right + 1])
+
+    def subset(self, rows, columns=None):
+        # New sheet with the given rows (an array, in order) of the given columns
+        columns = range(len(self.columns)) if columns is None else columns
+        headers = None
+        if self.headers:
+            headers = [self.headers[col] if col < len(self.headers) else '' for col in columns]
+        return SheetData([self.columns[col].subset(rows) if col < len(self.columns) else Column().subset(rows)
+                          for col in columns], len(rows), headers)
+
+    def to_dataframe(self, names=None):
+        # Typed DataFrame over the whole sheet, columns named after the headers
+        names = names or column_names(self.headers, len(self.columns))
+        rows = np.arange(self.row_count)
+        return pd.DataFrame({name: (column if column.length == self.row_count else column.subset(rows)).to_pandas()
+                             for name, column in zip(names, self.columns)}, index=pd.RangeIndex(self.row_count))
+
+
+def column_names(headers, count):
+    # Header names, with the C label wherever a name is missing or repeated
+    names = []
+    for col in range(count):
+        name = headers[col] if headers and col < len(headers) else ''
+        names.append(name if name and name not in names else f'C{col + 1}')
+    return names
+
+
+def read_csv(path, fmt=DEFAULT_FORMAT, chunk_rows=50000):
+    # Whole file into a SheetData, for callers without a GUI to feed
+    sheet = SheetData()
+    for rows, _, _ in read_csv_chunks(path, chunk_rows, chunk_rows, fmt):
+        if fmt.has_header and sheet.headers is None:
+            sheet.headers, rows = rows[0], rows[1:]
+        sheet.append_rows(rows)
+    return sheet
+
+
+def read_csv_chunks(path, chunk_rows=50000, first_chunk_rows=500, fmt=DEFAULT_FORMAT):
+    # Yields (rows, bytes_read, total_bytes) so callers can show progress and stop
+    # early. The first chunk is small so the first screenful shows up right away.
+    # A header row comes through as the first row.
+    total_bytes = os.path.getsize(path)
+    with open(path, 'r', newline='', encoding=fmt.encoding) as file:
+        reader = csv.reader(file, delimiter=fmt.delimiter, quotechar=fmt.quotechar)
+        size = first_chunk_rows
+        while True:
+            rows = list(itertools.islice(reader, size))
+            if not rows:
+                break
+            yield rows, file.buffer.tell(), total_bytes
+            size = chunk_rows
+
+
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def open_csv_output(path, compression=None):
+    # compression is None, 'gzip' or 'zstd'; by default it follows the file suffix
+    if compression is None:
+        compression = COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', newline='', encoding='utf-8', compresslevel=6)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        return zstandard.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+
+
+def write_csv(sheet, path, compression=None, batch_rows=10000, progress=None, cancelled=None):
+    # Streams the used part of the sheet to disk one batch of rows at a time.
+    # progress(rows_written, total_rows) is called after every batch; returns
+    # False when cancelled() asked to stop early.
+    row_count, column_count = sheet.extent()
+    headers = getattr(sheet, 'headers', None)
+    with open_csv_output(path, compression) as file:
+        writer = csv.writer(file)
+        if headers:
+            column_count = max(column_count, len(headers))
+            writer.writerow(headers + [''] * (column_count - len(headers)))
+        for start in range(0, row_count, batch_rows):
+            if cancelled is not None and cancelled():
+                return False
+            stop = min(start + batch_rows, row_count)
+            writer.writerows(sheet.iter_rows(start, stop, batch_rows, column_count))
+            if progress is not None:
+                progress(stop, row_count)
+    return True
+
+
+def to_delimited(columns, delimiter='\t'):
+    # Serialises columns of texts the way spreadsheets put ranges on the clipboard
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=delimiter, lineterminator='\n').writerows(zip(*columns))
+    return buffer.getvalue()
+
+
+def parse_delimited(text, delimiter='\t'):
+    # Columns of texts from pasted TSV (plain text), or CSV from text/csv
+    rows = list(csv.reader(io.StringIO(text, newline=''), delimiter=delimiter))
+    return [list(texts) for texts in itertools.zip_longest(*rows, fillvalue='')]
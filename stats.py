@@ -0,0 +1,69 @@
+from collections import namedtuple
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+Summary = namedtuple('Summary', 'count sum mean min max variance std median percentiles')
+
+DEFAULT_PERCENTILES = (5, 25, 75, 95)
+
+
+def summarize(chunks, percentiles=DEFAULT_PERCENTILES):
+    # Every metric from one pass over the chunks. Per-chunk moments are merged
+    # with Chan's parallel form of Welford's update, which stays stable where
+    # sum(x**2) - n*mean**2 would cancel. Returns None when nothing is numeric.
+    count, mean, m2, total = 0, 0.0, 0.0, 0.0
+    low, high = np.inf, -np.inf
+    kept = []
+    for values in chunks:
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if not n:
+            continue
+        chunk_mean = values.mean()
+        chunk_m2 = np.square(values - chunk_mean).sum()
+        delta = chunk_mean - mean
+        merged = count + n
+        mean += delta * n / merged
+        m2 += chunk_m2 + delta * delta * count * n / merged
+        count = merged
+        total += values.sum()
+        low = min(low, values.min())
+        high = max(high, values.max())
+        kept.append(values)
+
+    if not count:
+        return None
+    variance = m2 / count
+    values = np.concatenate(kept)
+    quantiles = np.percentile(values, (50,) + tuple(percentiles))
+    return Summary(count, float(total), float(mean), float(low), float(high), float(variance),
+                   float(variance ** 0.5), float(quantiles[0]), dict(zip(percentiles, quantiles[1:].tolist())))
+
+
+def selection_totals(sheet, ranges):
+    # (sum, count) of the numeric cells in rectangular ranges from the cached
+    # per-column prefix sums: O(columns) no matter how many rows are selected
+    total, count = 0.0, 0
+    for top, left, bottom, right in ranges:
+        for col in range(left, min(right, sheet.column_count - 1) + 1):
+            sums, counts = sheet.columns[col].prefix_sums()
+            start, stop = min(top, len(counts) - 1), min(bottom + 1, len(counts) - 1)
+            total += sums[stop] - sums[start]
+            count += int(counts[stop] - counts[start])
+    return float(total), count
+
+
+def format_summary(summary):
+    lines = [
+        f'Count: {summary.count}',
+        f'Sum: {summary.sum:.2f}',
+        f'Average: {summary.mean:.2f}',
+        f'Min: {summary.min:.2f}',
+        f'Max: {summary.max:.2f}',
+        f'Median: {summary.median:.2f}',
+    ]
+    lines += [f'P{p}: {value:.2f}' for p, value in summary.percentiles.items()]
+    lines += [f'Variance: {summary.variance:.2f}', f'Standard Deviation: {summary.std:.2f}']
+    return '\n'.join(lines)
@@ -1,30 +1,720 @@
+import time
+STARTED = time.perf_counter()
 import csv
+import os
+import re
 import sys
-from PyQt5.QtWidgets import QMainWindow, QApplication, QTableWidget, QTableWidgetItem, QVBoxLayout, QPushButton, QFileDialog, QAction, QMenu, QWidget, QUndoStack , QUndoCommand , QShortcut , QMessageBox  
+from concurrent.futures import BrokenExecutor
+from PyQt5.QtWidgets import QMainWindow, QApplication, QTableView, QVBoxLayout, QPushButton, QFileDialog, QAction, QMenu, QWidget, QShortcut , QMessageBox , QProgressDialog , QLabel , QDialog , QFormLayout , QSpinBox , QComboBox , QLineEdit , QDialogButtonBox , QHBoxLayout , QCheckBox , QTableWidget , QTableWidgetItem , QListWidget , QListWidgetItem
 from PyQt5.QtGui import  QKeySequence
-from PyQt5.QtCore import Qt
-import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QThread, QSemaphore, QTimer, QMimeData, QFileSystemWatcher, pyqtSignal
+from sheet_data import SheetData, column_names, read_csv_chunks, write_csv, to_delimited, parse_delimited
+from large_file import LargeCsvFile
+from dialects import CsvFormat, sniff, preview_rows
+from follow import CsvTail
+from formulas import FormulaEngine
+from groupby import AGGREGATES, group_by, to_sheet
+from file_cache import ParseCache, format_stats
+from formats import is_table_file, table_schema, parse_filters, read_table, write_table
+from perf import RECORDER, format_overlay
+from parallel_csv import can_parse_parallel, process_pool, plan_ranges, parse_ranges, read_header
+from stats import summarize, format_summary, selection_totals
+from history import History, RangeEdit
+from query import sort_order, Filter, FILTER_OPS, filter_mask, matching_rows, replace_texts
+from lazy_imports import lazy_import, is_loaded
+
+# NumPy and pandas load on first use, not while the window opens
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+IMPORTED = time.perf_counter()
 ### Easy CSV  v1.0 --- by Berk ÇIKIKCI --- don't forget to follow on Linkedin for further projects ----  ###
-class SetItemCommand(QUndoCommand):
-    def __init__(self, table, row, col, prev_item, new_item):
-        super().__init__()
-        self.table = table
-        self.row = row
-        self.col = col
-        self.prev_text = prev_item.text() if prev_item else None
-        self.new_text = new_item.text() if new_item else None
+class SheetModel(QAbstractTableModel):
+    # Virtual view over SheetData: nothing is allocated per cell, the view only
+    # asks for the cells it paints. min_rows/min_cols keep an empty editable grid.
+    def __init__(self, sheet, history, min_rows=10000, min_cols=10000, parent=None):
+        super().__init__(parent)
+        self.sheet = sheet
+        self.history = history
+        self.min_rows = min_rows
+        self.min_cols = min_cols
+        # View row -> sheet row while sorted or filtered. View rows past its end
+        # show sheet rows from row_base on, i.e. rows added since.
+        self.row_order = None
+        self.row_base = 0
+        self.filtered = False
+        self.sort_keys = []
+        self.filters = []
+        self.formulas = FormulaEngine()
+        # Set by the window while a worker reads the sheet
+        self.locked = False
 
-    def undo(self):
-        if self.prev_text is not None:
-            self.table.setItem(self.row, self.col, QTableWidgetItem(self.prev_text))
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.view_row_count(self.sheet.row_count)
+
+    def view_row_count(self, sheet_rows):
+        if self.row_order is None:
+            return max(sheet_rows, self.min_rows)
+        extra = max(0, sheet_rows - self.row_base)
+        return max(len(self.row_order) + extra, 0 if self.filtered else self.min_rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return max(self.sheet.column_count, self.min_cols)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.sheet.cell(self.data_row(index.row()), index.column())
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or self.locked:
+            return False
+        if value == self.sheet.cell(self.data_row(index.row()), index.column()):
+            return False
+        self.write('Edit', [(index.row(), index.column(), [[value]])])
+        return True
+
+    def flags(self, index):
+        if self.sheet.read_only or index.column() in self.formulas:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.ToolTipRole and orientation == Qt.Horizontal:
+            return self.formulas.text(section)
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            headers = self.sheet.headers
+            if headers and section < len(headers) and headers[section]:
+                return headers[section]
+            return f"C{section + 1}"
+        return f"R{self.data_row(section) + 1}"
+
+    def reset(self, sheet, min_rows=0, min_cols=0):
+        self.beginResetModel()
+        self.sheet = sheet
+        self.min_rows = min_rows
+        self.min_cols = min_cols
+        self.row_order = None
+        self.filtered = False
+        self.sort_keys = []
+        self.filters = []
+        self.formulas = FormulaEngine()
+        self.endResetModel()
+
+    def data_row(self, row):
+        if self.row_order is None:
+            return row
+        if row >= len(self.row_order):
+            return self.row_base + row - len(self.row_order)
+        return int(self.row_order[row])
+
+    def data_rows(self, top, bottom):
+        # Sheet rows behind view rows top..bottom: the top row when they are
+        # contiguous, otherwise an array of rows
+        if self.row_order is None or top >= len(self.row_order):
+            return self.data_row(top)
+        past_end = np.arange(self.row_base, self.row_base + max(0, bottom + 1 - len(self.row_order)))
+        return np.concatenate([self.row_order[top:bottom + 1], past_end])
+
+    def row_selector(self, top, bottom):
+        # Same rows as a slice or index array for NumPy column data
+        rows = self.data_rows(top, bottom)
+        return slice(rows, rows + bottom - top + 1) if isinstance(rows, int) else rows
+
+    def read_columns(self, top, left, bottom, right):
+        rows = self.data_rows(top, bottom)
+        if isinstance(rows, int):
+            return self.sheet.columns_block(rows, left, rows + bottom - top, right)
+        return self.sheet.columns_at(rows, left, right)
+
+    def view_position(self, rows):
+        # View rows showing the given sheet rows, -1 where a row is filtered out
+        if self.row_order is None:
+            return rows
+        if self.positions_cache is None or len(self.positions_cache) != self.sheet.row_count:
+            positions = np.full(max(self.sheet.row_count, self.row_base), -1, dtype=np.int64)
+            positions[self.row_order] = np.arange(len(self.row_order))
+            positions[self.row_base:] = len(self.row_order) + np.arange(len(positions) - self.row_base)
+            self.positions_cache = positions
+        return self.positions_cache[rows]
+
+    def set_row_order(self, order, filtered=False, row_base=None):
+        # order is None (file order) or the sheet rows to show, in view order.
+        # row_base is the row count order was built for; rows added since
+        # (e.g. while a sort ran) are shown after it.
+        self.layoutAboutToBeChanged.emit()
+        self.row_order = order
+        self.row_base = self.sheet.row_count if row_base is None else row_base
+        self.filtered = filtered
+        self.positions_cache = None
+        self.layoutChanged.emit()
+
+    def grow(self, row_count, column_count):
+        # Makes room for row_count sheet rows and column_count columns
+        rows, cols = self.rowCount(), self.columnCount()
+        view_rows = self.view_row_count(row_count)
+        if view_rows > rows:
+            self.beginInsertRows(QModelIndex(), rows, view_rows - 1)
+            self.sheet.ensure_size(row_count, 0)
+            self.endInsertRows()
+        else:
+            self.sheet.ensure_size(row_count, 0)
+        if column_count > cols:
+            self.beginInsertColumns(QModelIndex(), cols, column_count - 1)
+            self.sheet.ensure_size(0, column_count)
+            self.endInsertColumns()
+
+    def set_columns(self, rows, left, columns):
+        # One bulk write of columns of texts at sheet rows: the top row of a
+        # contiguous block or an array of rows
+        if not columns or not columns[0]:
+            return
+        scattered = isinstance(rows, np.ndarray)
+        last = int(rows.max()) if scattered else rows + len(columns[0]) - 1
+        right = left + len(columns) - 1
+        self.grow(last + 1, right + 1)
+        self.sheet.set_columns(rows, left, columns)
+        if scattered or self.row_order is not None:
+            top, bottom = 0, self.rowCount() - 1
         else:
-            self.table.takeItem(self.row, self.col)
+            top, bottom = rows, last
+        self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
+
+    def write(self, label, parts):
+        # Applies (top, left, columns) parts, given in view rows, as one undoable edit
+        self.write_at(label, [(self.data_rows(top, top + len(columns[0]) - 1), left, columns)
+                              for top, left, columns in parts if columns and columns[0]])
+
+    def write_at(self, label, parts):
+        # Same for parts addressed by sheet rows: a top row or an array of rows
+        edit = RangeEdit(label)
+        for rows, left, columns in parts:
+            if not columns or not len(columns[0]):
+                continue
+            right = left + len(columns) - 1
+            if isinstance(rows, np.ndarray):
+                before = self.sheet.columns_at(rows, left, right)
+            else:
+                before = self.sheet.columns_block(rows, left, rows + len(columns[0]) - 1, right)
+            edit.add(rows, left, before, columns)
+            self.set_columns(rows, left, columns)
+        if edit.parts:
+            self.history.push(edit)
+        self.update_formulas()
+
+    def undo(self):
+        edit = self.history.undo()
+        if edit is not None:
+            for rows, left, before, _ in reversed(edit.parts):
+                self.set_columns(rows, left, before.columns())
+            self.update_formulas()
+        return edit
 
     def redo(self):
-        if self.new_text is not None:
-            self.table.setItem(self.row, self.col, QTableWidgetItem(self.new_text))
+        edit = self.history.redo()
+        if edit is not None:
+            for rows, left, _, after in edit.parts:
+                self.set_columns(rows, left, after.columns())
+            self.update_formulas()
+        return edit
+
+    def append_rows(self, rows):
+        self.append(len(rows), max(len(row) for row in rows), lambda: self.sheet.append_rows(rows))
+
+    def append_columns(self, row_count, columns):
+        self.append(row_count, len(columns), lambda: self.sheet.append_columns(row_count, columns))
+
+    def append(self, row_count, width, apply):
+        # Announces row_count new rows at the end, added to the sheet by apply()
+        self.grow(0, width)
+        first, last = self.rowCount(), self.view_row_count(self.sheet.row_count + row_count) - 1
+        if last < first:
+            apply()
+            self.dataChanged.emit(self.index(0, 0), self.index(first - 1, self.columnCount() - 1))
         else:
-            self.table.takeItem(self.row, self.col)
+            self.beginInsertRows(QModelIndex(), first, last)
+            apply()
+            self.endInsertRows()
+        self.update_formulas()
+
+    def set_formula(self, col, text):
+        # Makes col a computed column; text None turns it back into plain
+        # cells holding the last results. Raises ValueError for a bad formula.
+        if text is None:
+            self.formulas.remove(col)
+        else:
+            self.formulas.define(col, text, self.sheet)
+            self.update_formulas()
+        self.headerDataChanged.emit(Qt.Horizontal, col, col)
+
+    def update_formulas(self):
+        # Recomputes the formula columns whose inputs changed since last time
+        if not self.formulas.order:
+            return
+        self.grow(0, max(self.formulas.order) + 1)
+        for col in self.formulas.update(self.sheet):
+            self.dataChanged.emit(self.index(0, col), self.index(self.rowCount() - 1, col))
+
+class LargeFileModel(SheetModel):
+    # Columns of a LargeCsvFile are only known once rows are parsed, so the
+    # column count catches up after painting reveals a wider row.
+    def __init__(self, sheet, parent=None):
+        super().__init__(sheet, None, min_rows=0, min_cols=0, parent=parent)
+        self.known_columns = sheet.column_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.known_columns
+
+    def data(self, index, role=Qt.DisplayRole):
+        value = super().data(index, role)
+        if self.sheet.column_count > self.known_columns:
+            QTimer.singleShot(0, self.sync_columns)
+        return value
+
+    def sync_columns(self):
+        if self.sheet.column_count > self.known_columns:
+            self.beginInsertColumns(QModelIndex(), self.known_columns, self.sheet.column_count - 1)
+            self.known_columns = self.sheet.column_count
+            self.endInsertColumns()
+
+class ImportWorker(QObject):
+    # Parses a CSV on a background thread and hands rows to the GUI thread in
+    # chunks. At most max_pending chunks are in flight, which bounds memory when
+    # the GUI falls behind the parser. Large files are parsed by a process
+    # pool into typed columns instead. A Parquet or Arrow file (table is
+    # (columns, filters)) or a CSV found in the parse cache arrives as one
+    # finished sheet; parsed is set once a CSV was read through to the end.
+    chunkReady = pyqtSignal(object)
+    columnsReady = pyqtSignal(int, object)
+    headersReady = pyqtSignal(object)
+    tableReady = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, file_path, fmt, chunk_rows=50000, max_pending=4, table=None, cache=None):
+        super().__init__()
+        self.file_path = file_path
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.pending = QSemaphore(max_pending)
+        self.table = table
+        self.cache = cache
+        self.cancelled = False
+        self.parsed = False
+
+    def run(self):
+        try:
+            if self.table is not None:
+                sheet = read_table(self.file_path, *self.table)
+                if not self.cancelled:
+                    self.tableReady.emit(sheet)
+            elif not self.load_cached():
+                if not (can_parse_parallel(self.file_path, self.fmt) and self.run_parallel()):
+                    header = self.fmt.has_header
+                    for rows, bytes_read, total_bytes in read_csv_chunks(self.file_path, self.chunk_rows, fmt=self.fmt):
+                        if header:
+                            self.headersReady.emit(rows[0])
+                            rows, header = rows[1:], False
+                            if not rows:
+                                continue
+                        self.pending.acquire()
+                        if self.cancelled:
+                            break
+                        self.chunkReady.emit(rows)
+                        self.progress.emit(int(1000 * bytes_read / total_bytes) if total_bytes else 1000)
+                self.parsed = not self.cancelled
+        except (OSError, ValueError, LookupError, UnicodeDecodeError, csv.Error, BrokenExecutor) as e:
+            self.failed.emit(str(e))
+        self.finished.emit()
+
+    def load_cached(self):
+        sheet = self.cache.load(self.file_path, self.fmt) if self.cache is not None else None
+        if sheet is not None:
+            self.tableReady.emit(sheet)
+        return sheet is not None
+
+    def run_parallel(self):
+        # False when the file has to be read sequentially after all
+        with process_pool() as executor:
+            header = read_header(self.file_path, self.fmt) if self.fmt.has_header else (None, 0)
+            if header is None:
+                return False
+            headers, start = header
+            ranges = plan_ranges(self.file_path, executor, self.fmt, start)
+            if ranges is None:
+                return False
+            if headers is not None:
+                self.headersReady.emit(headers)
+            for row_count, columns, bytes_read, total_bytes in parse_ranges(self.file_path, ranges, executor, self.fmt):
+                self.pending.acquire()
+                if self.cancelled:
+                    break
+                self.columnsReady.emit(row_count, columns)
+                self.progress.emit(int(1000 * bytes_read / total_bytes) if total_bytes else 1000)
+        return True
+
+    def chunk_consumed(self):
+        self.pending.release()
+
+    def cancel(self):
+        self.cancelled = True
+        self.pending.release()
+
+class ExportWorker(QObject):
+    # Streams the sheet to disk on a background thread. Edits are blocked by
+    # the window while this runs, so the worker reads the live columns.
+    # columns (indexes) picks what goes into a Parquet or Arrow file.
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, sheet, file_path, columns=None):
+        super().__init__()
+        self.sheet = sheet
+        self.file_path = file_path
+        self.columns = columns
+        self.cancelled = False
+
+    def run(self):
+        try:
+            if is_table_file(self.file_path):
+                completed = write_table(self.sheet, self.file_path, self.columns, progress=self.report, cancelled=lambda: self.cancelled)
+            else:
+                completed = write_csv(self.sheet, self.file_path, progress=self.report, cancelled=lambda: self.cancelled)
+            if not completed:
+                os.remove(self.file_path)
+        except (OSError, ValueError, csv.Error) as e:
+            self.failed.emit(str(e))
+        self.finished.emit()
+
+    def report(self, rows_written, total_rows):
+        self.progress.emit(int(1000 * rows_written / total_rows))
+
+    def cancel(self):
+        self.cancelled = True
+
+class CacheWorker(QObject):
+    # Saves a freshly parsed sheet to the parse cache. Edits are blocked by
+    # the window until it is done, as for an export.
+    finished = pyqtSignal()
+
+    def __init__(self, cache, file_path, fmt, sheet):
+        super().__init__()
+        self.cache = cache
+        self.file_path = file_path
+        self.fmt = fmt
+        self.sheet = sheet
+
+    def run(self):
+        try:
+            self.cache.store(self.file_path, self.fmt, self.sheet)
+        except (OSError, ValueError):
+            pass  # the cache is only a shortcut; the file parses next time
+        self.finished.emit()
+
+class CopyWorker(QObject):
+    # Serialises a large copied range off the GUI thread. The columns are a
+    # snapshot taken on the GUI thread, so later edits don't race with it.
+    serialized = pyqtSignal(str, str)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def run(self):
+        try:
+            self.serialized.emit(to_delimited(self.columns, '\t'), to_delimited(self.columns, ','))
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+        finally:
+            self.finished.emit()
+
+class SortWorker(QObject):
+    # Computes a sort permutation off the GUI thread; edits are blocked meanwhile
+    sorted = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, sheet, keys):
+        super().__init__()
+        self.sheet = sheet
+        self.keys = keys
+
+    def run(self):
+        try:
+            self.sorted.emit(sort_order(self.sheet, self.keys), self.keys)
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+        finally:
+            self.finished.emit()
+
+class GroupWorker(QObject):
+    # Computes a group-by/pivot summary off the GUI thread; edits are blocked
+    # meanwhile, as for an export. request is group_by's (keys, values,
+    # aggregates, pivot); key identifies it for the window's cache.
+    grouped = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, sheet, key, request):
+        super().__init__()
+        self.sheet = sheet
+        self.key = key
+        self.request = request
+
+    def run(self):
+        try:
+            self.grouped.emit(self.key, group_by(self.sheet, *self.request))
+        except MemoryError:
+            self.failed.emit('Not enough memory')
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+        finally:
+            self.finished.emit()
+
+class ImportDialog(QDialog):
+    # Shows how the file reads with the sniffed format and lets the user
+    # change the encoding, delimiter, quote character and header row
+    DELIMITERS = (('Comma', ','), ('Semicolon', ';'), ('Tab', '\t'), ('Pipe', '|'), ('Space', ' '))
+    ENCODINGS = ('utf-8', 'utf-8-sig', 'utf-16', 'latin-1', 'cp1252')
+
+    def __init__(self, file_path, fmt, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.setWindowTitle('Import Options')
+        layout = QFormLayout(self)
+        self.encodingBox = QComboBox()
+        self.encodingBox.setEditable(True)
+        self.encodingBox.addItems([fmt.encoding] + [e for e in self.ENCODINGS if e != fmt.encoding])
+        layout.addRow('Encoding', self.encodingBox)
+        self.delimiterBox = QComboBox()
+        for name, delimiter in self.DELIMITERS:
+            self.delimiterBox.addItem(name, delimiter)
+        if self.delimiterBox.findData(fmt.delimiter) < 0:
+            self.delimiterBox.addItem(repr(fmt.delimiter), fmt.delimiter)
+        self.delimiterBox.setCurrentIndex(self.delimiterBox.findData(fmt.delimiter))
+        layout.addRow('Delimiter', self.delimiterBox)
+        self.quoteBox = QComboBox()
+        self.quoteBox.addItems(['"', "'"] if fmt.quotechar in '"\'' else [fmt.quotechar, '"', "'"])
+        self.quoteBox.setCurrentText(fmt.quotechar)
+        layout.addRow('Quote character', self.quoteBox)
+        self.headerBox = QCheckBox('First row holds column names')
+        self.headerBox.setChecked(fmt.has_header)
+        layout.addRow(self.headerBox)
+        self.preview = QTableWidget()
+        layout.addRow(self.preview)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.encodingBox.currentTextChanged.connect(self.update_preview)
+        self.delimiterBox.currentIndexChanged.connect(self.update_preview)
+        self.quoteBox.currentIndexChanged.connect(self.update_preview)
+        self.headerBox.toggled.connect(self.update_preview)
+        self.update_preview()
+
+    def format(self):
+        return CsvFormat(self.encodingBox.currentText().strip(), self.delimiterBox.currentData(),
+                         self.quoteBox.currentText(), self.headerBox.isChecked())
+
+    def update_preview(self):
+        fmt = self.format()
+        rows = preview_rows(self.file_path, fmt)
+        headers = rows.pop(0) if fmt.has_header and rows else []
+        width = max([len(headers)] + [len(row) for row in rows])
+        self.preview.clear()
+        self.preview.setRowCount(len(rows))
+        self.preview.setColumnCount(width)
+        self.preview.setHorizontalHeaderLabels([headers[col] if col < len(headers) and headers[col] else f'C{col + 1}'
+                                                for col in range(width)])
+        for row, values in enumerate(rows):
+            for col, text in enumerate(values):
+                self.preview.setItem(row, col, QTableWidgetItem(text))
+
+def checkable_list(names, checked=()):
+    widget = QListWidget()
+    for row, name in enumerate(names):
+        item = QListWidgetItem(name)
+        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+        item.setCheckState(Qt.Checked if row in checked else Qt.Unchecked)
+        widget.addItem(item)
+    return widget
+
+def checked_rows(widget):
+    return [row for row in range(widget.count()) if widget.item(row).checkState() == Qt.Checked]
+
+class ColumnsDialog(QDialog):
+    # Picks the columns of a Parquet/Arrow import or export. With a schema
+    # it also takes row conditions, checked before the dialog closes.
+    def __init__(self, title, names, schema=None, parent=None):
+        super().__init__(parent)
+        self.schema = schema
+        self.setWindowTitle(title)
+        layout = QFormLayout(self)
+        self.columnList = checkable_list(names, range(len(names)))
+        layout.addRow('Columns', self.columnList)
+        self.whereEdit = QLineEdit()
+        self.whereEdit.setPlaceholderText('e.g. price > 10; city in Berlin, Paris')
+        if schema is not None:
+            layout.addRow('Rows where', self.whereEdit)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def columns(self):
+        return checked_rows(self.columnList)
+
+    def filters(self):
+        return parse_filters(self.whereEdit.text(), self.schema) if self.schema is not None else None
+
+    def accept(self):
+        if not self.columns():
+            return QMessageBox.warning(self, 'Columns', 'Choose at least one column.')
+        try:
+            self.filters()
+        except ValueError as e:
+            return QMessageBox.warning(self, 'Rows where', str(e))
+        super().accept()
+
+class GroupByDialog(QDialog):
+    # Group columns, an optional pivot column whose values become column
+    # groups, and the aggregates of the value columns. No value columns
+    # counts the rows of each group.
+    def __init__(self, names, col, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Group By / Pivot')
+        layout = QFormLayout(self)
+        self.keyList = checkable_list(names, [col])
+        layout.addRow('Group by', self.keyList)
+        self.pivotBox = QComboBox()
+        self.pivotBox.addItems(['(none)'] + names)
+        layout.addRow('Pivot on', self.pivotBox)
+        self.valueList = checkable_list(names)
+        layout.addRow('Values', self.valueList)
+        self.aggregateList = checkable_list(AGGREGATES, [AGGREGATES.index('sum')])
+        layout.addRow('Aggregates', self.aggregateList)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def request(self):
+        # group_by's (keys, values, aggregates, pivot)
+        pivot = self.pivotBox.currentIndex() - 1
+        return (tuple(checked_rows(self.keyList)), tuple(checked_rows(self.valueList)),
+                tuple(AGGREGATES[row] for row in checked_rows(self.aggregateList)), pivot if pivot >= 0 else None)
+
+    def accept(self):
+        keys, values, aggregates, pivot = self.request()
+        if not keys:
+            return QMessageBox.warning(self, 'Group by', 'Choose at least one column to group by.')
+        if pivot in keys:
+            return QMessageBox.warning(self, 'Pivot on', 'The pivot column cannot also be a group column.')
+        if values and not aggregates:
+            return QMessageBox.warning(self, 'Aggregates', 'Choose at least one aggregate.')
+        super().accept()
+
+class FilterDialog(QDialog):
+    def __init__(self, column_count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Filter Rows')
+        layout = QFormLayout(self)
+        self.columnBox = QSpinBox()
+        self.columnBox.setRange(1, max(column_count, 1))
+        self.columnBox.setPrefix('C')
+        layout.addRow('Column', self.columnBox)
+        self.opBox = QComboBox()
+        self.opBox.addItems(FILTER_OPS)
+        layout.addRow('Condition', self.opBox)
+        self.valueEdit = QLineEdit()
+        layout.addRow('Value (from)', self.valueEdit)
+        self.value2Edit = QLineEdit()
+        layout.addRow('To (range only)', self.value2Edit)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def filter(self):
+        return Filter(self.columnBox.value() - 1, self.opBox.currentText(), self.valueEdit.text(), self.value2Edit.text())
+
+class FormulaDialog(QDialog):
+    # Computed column: a formula over other columns, e.g. =C3*C4 or =C2/SUM(C2).
+    # Shows the formula a column already has when it is picked.
+    def __init__(self, formulas, col, parent=None):
+        super().__init__(parent)
+        self.formulas = formulas
+        self.setWindowTitle('Computed Column')
+        layout = QFormLayout(self)
+        self.columnBox = QSpinBox()
+        self.columnBox.setRange(1, 1 << 20)
+        self.columnBox.setPrefix('C')
+        self.columnBox.setValue(col + 1)
+        layout.addRow('Column', self.columnBox)
+        self.formulaEdit = QLineEdit()
+        self.formulaEdit.setPlaceholderText('e.g. =C3*C4, =C2/SUM(C2), =IF(C1>0, C1, 0)')
+        layout.addRow('Formula', self.formulaEdit)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.columnBox.valueChanged.connect(self.show_formula)
+        self.show_formula()
+
+    def show_formula(self):
+        self.formulaEdit.setText(self.formulas.text(self.column()) or '=')
+
+    def column(self):
+        return self.columnBox.value() - 1
+
+class FindDialog(QDialog):
+    # Non-modal find/replace; column 0 searches every column
+    findNext = pyqtSignal(int, str, str)
+    replaceAll = pyqtSignal(int, str, str, str)
+
+    def __init__(self, column_count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Find / Replace')
+        layout = QFormLayout(self)
+        self.columnBox = QSpinBox()
+        self.columnBox.setRange(0, max(column_count, 1))
+        self.columnBox.setPrefix('C')
+        self.columnBox.setSpecialValueText('All columns')
+        layout.addRow('Column', self.columnBox)
+        self.opBox = QComboBox()
+        self.opBox.addItems(['contains', 'equals', 'regex'])
+        layout.addRow('Match', self.opBox)
+        self.findEdit = QLineEdit()
+        layout.addRow('Find', self.findEdit)
+        self.replaceEdit = QLineEdit()
+        layout.addRow('Replace with', self.replaceEdit)
+        buttons = QHBoxLayout()
+        findButton = QPushButton('Find Next')
+        findButton.clicked.connect(lambda: self.findNext.emit(self.columnBox.value() - 1, self.opBox.currentText(), self.findEdit.text()))
+        buttons.addWidget(findButton)
+        replaceButton = QPushButton('Replace All')
+        replaceButton.clicked.connect(lambda: self.replaceAll.emit(self.columnBox.value() - 1, self.opBox.currentText(), self.findEdit.text(), self.replaceEdit.text()))
+        buttons.addWidget(replaceButton)
+        closeButton = QPushButton('Close')
+        closeButton.clicked.connect(self.close)
+        buttons.addWidget(closeButton)
+        layout.addRow(buttons)
+
+def edit_cells(edit):
+    # Cells an undone or redone edit wrote, 0 when there was nothing to do
+    return sum(before.width * before.height for _, _, before, _ in edit.parts) if edit is not None else 0
 
 class App(QMainWindow):
     def __init__(self):
@@ -34,9 +724,23 @@ class App(QMainWindow):
         self.top = 0
         self.width = 800
         self.height = 600
-        self.deleted_cells = []
         self.csv_loaded = False
-        self.undoStack = QUndoStack(self)
+        self.undo_memory_limit = 256 << 20
+        self.history = History(self.undo_memory_limit)
+        self.importThread = None
+        self.exportThread = None
+        self.copyThread = None
+        self.sortThread = None
+        self.cacheThread = None
+        self.groupThread = None
+        self.parse_cache = ParseCache()
+        self.follower = None
+        self.background_copy_cells = 100000
+        self.large_file_status_rows = 20000
+        self.heartbeat_ms = 50
+        self.summary_cache = (None, None)
+        self.group_cache = (None, None)
+        self.result_windows = []
 
         self.initUI()
 
@@ -49,27 +753,44 @@ class App(QMainWindow):
         deleteShortcut.activated.connect(self.delete)
         undoShortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
         undoShortcut.activated.connect(self.undo)
+        redoShortcut = QShortcut(QKeySequence("Ctrl+Y"), self)
+        redoShortcut.activated.connect(self.redo)
+        redoAltShortcut = QShortcut(QKeySequence("Ctrl+Shift+Z"), self)
+        redoAltShortcut.activated.connect(self.redo)
+        copyShortcut = QShortcut(QKeySequence.Copy, self)
+        copyShortcut.activated.connect(self.copy)
+        pasteShortcut = QShortcut(QKeySequence.Paste, self)
+        pasteShortcut.activated.connect(self.paste)
+        cutShortcut = QShortcut(QKeySequence.Cut, self)
+        cutShortcut.activated.connect(self.cut)
+        findShortcut = QShortcut(QKeySequence.Find, self)
+        findShortcut.activated.connect(self.show_find)
         
 
-        self.tableWidget = QTableWidget()
-        self.tableWidget.setRowCount(10000)
-        self.tableWidget.setColumnCount(10000)
-        headers = []
-        for i in range(10000):
-            headers.append(f"C{i + 1}")
-        self.tableWidget.setHorizontalHeaderLabels(headers)
-        row_labels = [f"R{i + 1}" for i in range(10000)]
-        self.tableWidget.setVerticalHeaderLabels(row_labels)
+        self.sheet = SheetData()
+        self.model = SheetModel(self.sheet, self.history, parent=self)
+        self.tableView = QTableView()
+        self.set_view_model(self.model)
+        self.tableView.horizontalHeader().sectionClicked.connect(self.sort_by_column)
+        self.model.dataChanged.connect(self.update_selection_status)
 
-        self.tableWidget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tableWidget.customContextMenuRequested.connect(self.contextMenuRequested)
+        self.tableView.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tableView.customContextMenuRequested.connect(self.contextMenuRequested)
 
-        self.layout.addWidget(self.tableWidget)
+        self.layout.addWidget(self.tableView)
 
         self.importButton = QPushButton("Import CSV")
         self.importButton.clicked.connect(self.importCSV)
         self.layout.addWidget(self.importButton)
 
+        self.largeFileButton = QPushButton("Open Large File (read-only)")
+        self.largeFileButton.clicked.connect(self.openLargeFile)
+        self.layout.addWidget(self.largeFileButton)
+
+        self.followButton = QPushButton("Follow Growing File (tail -f)")
+        self.followButton.clicked.connect(self.followFile)
+        self.layout.addWidget(self.followButton)
+
         self.exportButton = QPushButton("Export CSV")
         self.exportButton.clicked.connect(self.exportCSV)
         self.layout.addWidget(self.exportButton)
@@ -78,6 +799,35 @@ class App(QMainWindow):
         self.mainWidget.setLayout(self.layout)
         self.setCentralWidget(self.mainWidget)
 
+        self.selectionStatus = QLabel()
+        self.statusBar().addPermanentWidget(self.selectionStatus)
+        # Selections the prefix sums can't answer are summarised once input settles
+        self.selectionStatusTimer = QTimer(self)
+        self.selectionStatusTimer.setSingleShot(True)
+        self.selectionStatusTimer.setInterval(200)
+        self.selectionStatusTimer.timeout.connect(self.update_selection_status_full)
+
+        # Performance overlay (Ctrl+Shift+P): the latest timings over the table
+        self.perfOverlay = QLabel(self.tableView)
+        self.perfOverlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.perfOverlay.setStyleSheet('background: rgba(0, 0, 0, 170); color: white; font-family: monospace; padding: 6px;')
+        self.perfOverlay.hide()
+        self.perfOverlayTimer = QTimer(self)
+        self.perfOverlayTimer.setInterval(500)
+        self.perfOverlayTimer.timeout.connect(self.update_perf_overlay)
+        # Stall detection beats only while recording
+        self.perfHeartbeat = QTimer(self)
+        self.perfHeartbeat.setInterval(self.heartbeat_ms)
+        self.perfHeartbeat.timeout.connect(lambda: RECORDER.heartbeat(self.heartbeat_ms))
+        if RECORDER.enabled:
+            self.perfHeartbeat.start()
+        perfShortcut = QShortcut(QKeySequence("Ctrl+Shift+P"), self)
+        perfShortcut.activated.connect(self.toggle_perf_overlay)
+
+    def set_view_model(self, model):
+        self.tableView.setModel(model)
+        self.tableView.selectionModel().selectionChanged.connect(self.update_selection_status)
+
 
     def load_csv(self):
         options = QFileDialog.Options()
@@ -110,17 +860,88 @@ class App(QMainWindow):
         contextMenu.addAction(cut_action)
 
         undo_action = QAction("Undo", self)
-        undo_action.triggered.connect(self.undoStack.undo)
+        undo_action.triggered.connect(self.undo)
         contextMenu.addAction(undo_action)
 
+        redo_action = QAction("Redo", self)
+        redo_action.triggered.connect(self.redo)
+        contextMenu.addAction(redo_action)
+
+        clear_sort_action = QAction("Clear Sort", self)
+        clear_sort_action.triggered.connect(self.clear_sort)
+        clear_sort_action.setEnabled(bool(self.model.sort_keys))
+        contextMenu.addAction(clear_sort_action)
+
+        filter_action = QAction("Filter...", self)
+        filter_action.triggered.connect(self.show_filter)
+        contextMenu.addAction(filter_action)
+
+        clear_filters_action = QAction("Clear Filters", self)
+        clear_filters_action.triggered.connect(self.clear_filters)
+        clear_filters_action.setEnabled(bool(self.model.filters))
+        contextMenu.addAction(clear_filters_action)
+
+        find_action = QAction("Find/Replace...", self)
+        find_action.triggered.connect(self.show_find)
+        contextMenu.addAction(find_action)
+
+        cache_action = QAction("Parse Cache...", self)
+        cache_action.triggered.connect(self.show_cache_stats)
+        contextMenu.addAction(cache_action)
+
+        perf_action = QAction("Performance Overlay", self)
+        perf_action.setCheckable(True)
+        perf_action.setChecked(self.perfOverlay.isVisible())
+        perf_action.triggered.connect(self.toggle_perf_overlay)
+        contextMenu.addAction(perf_action)
+
+        trace_action = QAction("Save Performance Trace...", self)
+        trace_action.triggered.connect(self.save_perf_trace)
+        contextMenu.addAction(trace_action)
+
+        formula_action = QAction("Computed Column...", self)
+        formula_action.triggered.connect(self.show_formula)
+        formula_action.setEnabled(not self.sheet.read_only)
+        contextMenu.addAction(formula_action)
+
+        remove_formula_action = QAction("Remove Formula", self)
+        remove_formula_action.triggered.connect(self.remove_formula)
+        remove_formula_action.setEnabled(self.tableView.currentIndex().column() in self.model.formulas)
+        contextMenu.addAction(remove_formula_action)
+
         delete_action = QAction("Delete", self)
         delete_action.triggered.connect(self.delete)
         contextMenu.addAction(delete_action)
 
-        contextMenu.exec_(self.tableWidget.mapToGlobal(position))
+        contextMenu.exec_(self.tableView.mapToGlobal(position))
+
+    def view_idle(self):
+        # No sort or group-by is reading the sheet, so it may be replaced
+        return self.sortThread is None and self.groupThread is None
+
+    def workers_idle(self):
+        # No worker is filling or reading the sheet. An edit during an import
+        # would also be cached as the parsed file.
+        return self.importThread is None and self.exportThread is None and self.sortThread is None \
+            and self.cacheThread is None and self.groupThread is None
+
+    def editable(self):
+        return not self.sheet.read_only and self.workers_idle()
+
+    def update_edit_triggers(self):
+        # Called whenever a worker starts or finishes; a read-only sheet's
+        # cells are kept from editing by its model's flags
+        self.model.locked = not self.workers_idle()
+        self.tableView.setEditTriggers(QTableView.DoubleClicked | QTableView.EditKeyPressed | QTableView.AnyKeyPressed
+                                       if self.workers_idle() else QTableView.NoEditTriggers)
+
+    def selected_ranges(self):
+        # (top, left, bottom, right) for every rectangle in the selection
+        selection = self.tableView.selectionModel().selection()
+        return [(r.top(), r.left(), r.bottom(), r.right()) for r in selection]
 
     def keyPressEvent(self, event):
-        selected = self.tableWidget.selectedRanges()
+        selected = self.selected_ranges()
         if not selected:
             return
         
@@ -133,109 +954,440 @@ class App(QMainWindow):
         elif event.matches(QKeySequence.Cut):
             self.cut()
         elif event.matches(QKeySequence.Undo):
-            self.undoStack.undo()
+            self.undo()
+        elif event.matches(QKeySequence.Redo):
+            self.redo()
 
 
     def delete(self):
-        self.tableWidget.setUpdatesEnabled(False)
-        
-        # Deleted cells temp
-        temp_deleted = []
-        
-        selected_range = self.tableWidget.selectedRanges()[0]
-        for row in range(selected_range.topRow(), selected_range.bottomRow() + 1):
-            for col in range(selected_range.leftColumn(), selected_range.rightColumn() + 1):
-                item = self.tableWidget.item(row, col)
-                if item and item.text():
-                    # every deleted cells info save (row, col, value) 
-                    temp_deleted.append((row, col, item.text()))
-                    self.tableWidget.takeItem(row, col)
-        
-        
-        if temp_deleted:
-            self.deleted_cells.append(temp_deleted)
-        
-        self.tableWidget.setUpdatesEnabled(True)
+        selected = self.selected_ranges()
+        if not selected or not self.editable():
+            return
+        self.clear_ranges('Delete', selected)
 
-    def undo(self):
-        
-        print("Undo func triggered!")  # Debug
+    def clear_ranges(self, label, ranges):
+        parts = []
+        for top, left, bottom, right in ranges:
+            top, left, bottom, right = self.sheet.clamp(top, left, bottom, right)
+            if bottom >= top and right >= left:
+                parts.append((top, left, [[''] * (bottom - top + 1)] * (right - left + 1)))
+        with RECORDER.span(label.lower(), cells=sum(len(columns) * len(columns[0]) for _, _, columns in parts)):
+            self.model.write(label, parts)
 
-        if self.deleted_cells:
-            
-            last_deleted = self.deleted_cells.pop()
-        
-            print(f"Restore Cell Count: {len(last_deleted)}")  # Debug
+    def undo(self):
+        if self.editable():
+            span = RECORDER.span('undo')
+            span.finish(cells=edit_cells(self.model.undo()))
 
-            for row, col, value in last_deleted:
-                self.tableWidget.setItem(row, col, QTableWidgetItem(value))
-        else:
-            print("No Cells to Restore!")  # Debug 
+    def redo(self):
+        if self.editable():
+            span = RECORDER.span('redo')
+            span.finish(cells=edit_cells(self.model.redo()))
 
     def copy(self):
-        self.clipboard = []
-        selected_range = self.tableWidget.selectedRanges()[0]
-        for row in range(selected_range.topRow(), selected_range.bottomRow() + 1):
-            row_data = []
-            for col in range(selected_range.leftColumn(), selected_range.rightColumn() + 1):
-                item = self.tableWidget.item(row, col)
-                row_data.append(item.text() if item else '')
-            self.clipboard.append(row_data)
+        selected = self.selected_ranges()
+        if not selected or self.copyThread is not None:
+            return
+        top, left, bottom, right = self.sheet.clamp(*selected[0])
+        if bottom < top or right < left:
+            return
+        columns = self.tableView.model().read_columns(top, left, bottom, right)
+        if (bottom - top + 1) * (right - left + 1) < self.background_copy_cells:
+            return self.set_clipboard(to_delimited(columns, '\t'), to_delimited(columns, ','))
+
+        self.statusBar().showMessage('Copying...')
+        self.copyThread = QThread(self)
+        self.copyWorker = CopyWorker(columns)
+        self.copyWorker.moveToThread(self.copyThread)
+        self.copyThread.started.connect(self.copyWorker.run)
+        self.copyWorker.serialized.connect(self.set_clipboard)
+        self.copyWorker.failed.connect(self.copy_failed)
+        self.copyWorker.finished.connect(self.copy_finished)
+        self.copyThread.start()
+
+    def copy_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def copy_finished(self):
+        self.copyThread.quit()
+        self.copyThread.wait()
+        self.copyThread = None
+        self.copyWorker = None
+        self.statusBar().clearMessage()
+
+    def set_clipboard(self, tsv, csv_text):
+        mimeData = QMimeData()
+        mimeData.setText(tsv)
+        mimeData.setData('text/csv', csv_text.encode('utf-8'))
+        QApplication.clipboard().setMimeData(mimeData)
 
     def paste(self):
-        if not hasattr(self, 'clipboard') or not self.clipboard:
+        current = self.tableView.currentIndex()
+        if not current.isValid() or not self.editable():
             return
-        
-        start_row = self.tableWidget.currentRow()
-        start_col = self.tableWidget.currentColumn()
 
-        for row_offset, row_data in enumerate(self.clipboard):
-            for col_offset, cell_data in enumerate(row_data):
-                self.tableWidget.setItem(start_row + row_offset, start_col + col_offset, QTableWidgetItem(cell_data))
+        # Plain text is TSV, as copy writes it and spreadsheets do; commas in
+        # it are part of the cells
+        mimeData = QApplication.clipboard().mimeData()
+        if mimeData.hasFormat('text/csv'):
+            text, delimiter = bytes(mimeData.data('text/csv')).decode('utf-8', errors='replace'), ','
+        elif mimeData.hasText():
+            text, delimiter = mimeData.text(), '\t'
+        else:
+            return
+        span = RECORDER.span('paste')
+        columns = parse_delimited(text, delimiter)
+        if columns:
+            self.model.write('Paste', [(current.row(), current.column(), columns)])
+        span.finish(cells=len(columns) * len(columns[0]) if columns else 0)
 
     def cut(self):
         self.copy()
-        selected_range = self.tableWidget.selectedRanges()[0]
-        for row in range(selected_range.topRow(), selected_range.bottomRow() + 1):
-            for col in range(selected_range.leftColumn(), selected_range.rightColumn() + 1):
-                self.tableWidget.takeItem(row, col)
+        selected = self.selected_ranges()
+        if selected and self.editable():
+            self.clear_ranges('Cut', selected[:1])
 
     def importCSV(self):
         options = QFileDialog.Options()
-        filePath, _ = QFileDialog.getOpenFileName(self, "Open CSV File", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        filePath, _ = QFileDialog.getOpenFileName(self, "Open CSV File", "", "CSV Files (*.csv);;Parquet / Arrow (*.parquet *.arrow *.feather *.ipc);;All Files (*)", options=options)
         if not filePath:
             return
+        if is_table_file(filePath):
+            return self.import_table(filePath)
+        fmt = self.ask_format(filePath)
+        if fmt is not None:
+            self.start_import(filePath, fmt)
+
+    def import_table(self, filePath):
+        # Columns and row conditions are chosen up front, so Parquet only
+        # reads what they need
+        try:
+            schema = table_schema(filePath)
+        except (OSError, ValueError) as e:
+            return QMessageBox.critical(self, "Error", str(e))
+        dialog = ColumnsDialog("Import Columns", schema.names, schema, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        columns = dialog.columns()
+        names = None if len(columns) == len(schema.names) else [schema.names[col] for col in columns]
+        self.start_import(filePath, table=(names, dialog.filters()))
+
+    def ask_format(self, filePath):
+        # Sniffed format, confirmed or changed by the user; None if cancelled
+        try:
+            fmt = sniff(filePath)
+        except OSError as e:
+            return QMessageBox.critical(self, "Error", str(e))
+        dialog = ImportDialog(filePath, fmt, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        return dialog.format()
+
+    def start_import(self, filePath, fmt=None, table=None):
+        if self.importThread is not None or self.exportThread is not None or not self.view_idle():
+            return
+        try:
+            if table is None:
+                fmt = fmt or sniff(filePath)
+        except OSError as e:
+            return QMessageBox.critical(self, "Error", str(e))
+
+        self.stop_following()
+        self.close_large_file()
+        self.sheet = SheetData()
+        self.model.reset(self.sheet)
+        self.history.clear()
+
+        self.importProgress = QProgressDialog("Importing CSV...", "Cancel", 0, 1000, self)
+        self.importProgress.setWindowModality(Qt.WindowModal)
+        self.importProgress.setMinimumDuration(500)
+        if table is not None:
+            self.importProgress.setRange(0, 0)  # a table is read in one call
 
-        with open(filePath, 'r', newline='', encoding='utf-8') as file:
-            data = list(csv.reader(file))
+        self.importSpan = RECORDER.span('import', file=os.path.basename(filePath))
+        self.importThread = QThread(self)
+        self.importWorker = ImportWorker(filePath, fmt, table=table, cache=self.parse_cache)
+        self.importWorker.moveToThread(self.importThread)
+        self.importThread.started.connect(self.importWorker.run)
+        self.importWorker.chunkReady.connect(self.import_chunk)
+        self.importWorker.columnsReady.connect(self.import_columns)
+        self.importWorker.headersReady.connect(self.import_headers)
+        self.importWorker.tableReady.connect(self.import_sheet)
+        self.importWorker.progress.connect(self.importProgress.setValue)
+        self.importWorker.failed.connect(self.import_failed)
+        self.importWorker.finished.connect(self.import_finished)
+        # Direct so the flag is set while the worker thread is busy parsing
+        self.importProgress.canceled.connect(self.importWorker.cancel, Qt.DirectConnection)
+        self.importThread.start()
+        self.update_edit_triggers()
 
-        rowCount = len(data)
-        colCount = max(len(row) for row in data) if data else 0
+    def import_chunk(self, rows):
+        self.model.append_rows(rows)
+        self.importWorker.chunk_consumed()
 
-        self.tableWidget.setRowCount(rowCount)
-        self.tableWidget.setColumnCount(colCount)
+    def import_headers(self, headers):
+        self.sheet.headers = headers
+        self.model.grow(0, len(headers))
+        self.model.headerDataChanged.emit(Qt.Horizontal, 0, self.model.columnCount() - 1)
 
-        for row, rowData in enumerate(data):
-            for column, columnData in enumerate(rowData):
-                self.tableWidget.setItem(row, column, QTableWidgetItem(columnData))
+    def import_sheet(self, sheet):
+        self.sheet = sheet
+        self.model.reset(sheet)
+
+    def import_columns(self, row_count, columns):
+        self.model.append_columns(row_count, columns)
+        self.importWorker.chunk_consumed()
+
+    def import_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def import_finished(self):
+        self.importThread.quit()
+        self.importThread.wait()
+        self.importProgress.reset()
+        worker = self.importWorker
+        self.importThread = None
+        self.importWorker = None
+        self.update_edit_triggers()
+        self.importSpan.finish(rows=self.sheet.row_count, cells=self.sheet.row_count * self.sheet.column_count)
+        if worker.parsed and self.parse_cache.worth_caching(worker.file_path):
+            self.start_caching(worker.file_path, worker.fmt)
+
+    def start_caching(self, filePath, fmt):
+        if self.cacheThread is not None:
+            return
+        self.statusBar().showMessage('Caching parsed file...')
+        self.cacheThread = QThread(self)
+        self.cacheWorker = CacheWorker(self.parse_cache, filePath, fmt, self.sheet)
+        self.cacheWorker.moveToThread(self.cacheThread)
+        self.cacheThread.started.connect(self.cacheWorker.run)
+        self.cacheWorker.finished.connect(self.caching_finished)
+        self.cacheThread.start()
+        self.update_edit_triggers()
+
+    def caching_finished(self):
+        self.cacheThread.quit()
+        self.cacheThread.wait()
+        self.cacheThread = None
+        self.cacheWorker = None
+        self.statusBar().clearMessage()
+        self.update_edit_triggers()
+
+    def toggle_perf_overlay(self):
+        # Showing the overlay turns recording on; hiding it turns it off
+        # again unless EASYCSV_PERF asked for it
+        visible = not self.perfOverlay.isVisible()
+        RECORDER.set_enabled(visible or bool(os.environ.get('EASYCSV_PERF')))
+        if RECORDER.enabled:
+            self.perfHeartbeat.start()
+        else:
+            self.perfHeartbeat.stop()
+        if visible:
+            self.update_perf_overlay()
+            self.perfOverlay.show()
+            self.perfOverlayTimer.start()
+        else:
+            self.perfOverlay.hide()
+            self.perfOverlayTimer.stop()
+
+    def update_perf_overlay(self):
+        self.perfOverlay.setText(format_overlay(RECORDER))
+        self.perfOverlay.adjustSize()
+        self.perfOverlay.move(max(self.tableView.width() - self.perfOverlay.width() - 24, 0), 24)
+
+    def save_perf_trace(self):
+        if not RECORDER.events:
+            return QMessageBox.information(self, "Performance Trace", "Nothing recorded yet. Turn on the performance overlay (Ctrl+Shift+P) or start with EASYCSV_PERF=1.")
+        filePath, _ = QFileDialog.getSaveFileName(self, "Save Performance Trace", "easycsv-trace.json", "Chrome Trace (*.json);;All Files (*)")
+        if not filePath:
+            return
+        try:
+            RECORDER.dump(filePath)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", str(e))
+
+    def show_cache_stats(self):
+        box = QMessageBox(QMessageBox.Information, "Parse Cache", format_stats(self.parse_cache.stats()), QMessageBox.Close, self)
+        clearButton = box.addButton("Clear Cache", QMessageBox.ResetRole)
+        box.exec_()
+        if box.clickedButton() is clearButton:
+            self.parse_cache.clear()
+
+    def openLargeFile(self):
+        options = QFileDialog.Options()
+        filePath, _ = QFileDialog.getOpenFileName(self, "Open Large CSV File", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        if not filePath:
+            return
+        fmt = self.ask_format(filePath)
+        if fmt is not None:
+            self.open_large_file(filePath, fmt)
+
+    def open_large_file(self, filePath, fmt=None):
+        if self.importThread is not None or self.exportThread is not None or not self.view_idle():
+            return
+        try:
+            large_file = LargeCsvFile(filePath, fmt or sniff(filePath))
+        except (OSError, ValueError) as e:
+            return QMessageBox.critical(self, "Error", str(e))
+
+        self.stop_following()
+        self.close_large_file()
+        self.sheet = large_file
+        self.set_view_model(LargeFileModel(large_file, parent=self))
+
+    def followFile(self):
+        if self.follower is not None:
+            return self.stop_following()
+        options = QFileDialog.Options()
+        filePath, _ = QFileDialog.getOpenFileName(self, "Follow CSV File", "", "CSV Files (*.csv);;Log Files (*.log *.txt);;All Files (*)", options=options)
+        if not filePath:
+            return
+        fmt = self.ask_format(filePath)
+        if fmt is not None:
+            self.start_following(filePath, fmt)
+
+    def start_following(self, filePath, fmt=None, delay=250):
+        # Reads the file and then only what is appended to it. Change
+        # notifications within `delay` ms are taken as one read, so a writer
+        # flushing line by line costs one model update per delay, not per row.
+        if self.importThread is not None or self.exportThread is not None or not self.view_idle():
+            return
+        try:
+            follower = CsvTail(filePath, fmt or sniff(filePath))
+        except (OSError, ValueError) as e:
+            return QMessageBox.critical(self, "Error", str(e))
+
+        self.stop_following()
+        self.close_large_file()
+        self.sheet = SheetData()
+        self.model.reset(self.sheet)
+        self.history.clear()
+        self.follower = follower
+        self.follow_delay = delay
+        self.followTimer = QTimer(self)
+        self.followTimer.setSingleShot(True)
+        self.followTimer.timeout.connect(self.read_appended)
+        self.followWatcher = QFileSystemWatcher([filePath], self)
+        self.followWatcher.fileChanged.connect(self.follow_changed)
+        # Some file systems (network shares) send no notifications
+        self.followPoll = QTimer(self)
+        self.followPoll.setInterval(2000)
+        self.followPoll.timeout.connect(self.follow_changed)
+        self.followPoll.start()
+        self.followButton.setText("Stop Following")
+        self.read_appended()
+
+    def stop_following(self):
+        if self.follower is None:
+            return
+        self.followTimer.stop()
+        self.followPoll.stop()
+        self.followWatcher.deleteLater()
+        self.follower = None
+        self.followButton.setText("Follow Growing File (tail -f)")
+        self.statusBar().clearMessage()
+
+    def follow_changed(self, path=None):
+        # A replaced file (log rotation) drops out of the watcher
+        if path and path not in self.followWatcher.files() and os.path.exists(path):
+            self.followWatcher.addPath(path)
+        if not self.followTimer.isActive():
+            self.followTimer.start(self.follow_delay)
+
+    def read_appended(self):
+        follower = self.follower
+        if follower is None:
+            return
+        if follower.shrank():
+            follower.rewind()
+            self.sheet = SheetData()
+            self.model.reset(self.sheet)
+            self.history.clear()
+        try:
+            rows, more = follower.read()
+        except OSError as e:
+            self.stop_following()
+            return QMessageBox.critical(self, "Error", str(e))
+        except (UnicodeDecodeError, csv.Error) as e:
+            self.statusBar().showMessage(f'Following {os.path.basename(follower.path)}: {e}')
+            return
+        if follower.headers is not None and self.sheet.headers is None:
+            self.import_headers(follower.headers)
+        if rows:
+            scrollBar = self.tableView.verticalScrollBar()
+            at_bottom = scrollBar.value() == scrollBar.maximum()
+            self.model.append_rows(rows)
+            if at_bottom:
+                self.tableView.scrollToBottom()
+            self.update_selection_status()
+        self.statusBar().showMessage(f'Following {os.path.basename(follower.path)}: {self.sheet.row_count} rows')
+        if more:
+            self.followTimer.start(0)
+
+    def close_large_file(self):
+        if not self.sheet.read_only:
+            return
+        large_model = self.tableView.model()
+        self.set_view_model(self.model)
+        large_model.deleteLater()
+        self.sheet.close()
+        self.sheet = self.model.sheet
 
     def exportCSV(self):
         options = QFileDialog.Options()
-        filePath, _ = QFileDialog.getSaveFileName(self, "Save CSV File", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        filePath, selectedFilter = QFileDialog.getSaveFileName(self, "Save CSV File", "", "CSV Files (*.csv);;Gzip CSV (*.csv.gz);;Zstandard CSV (*.csv.zst);;Parquet (*.parquet);;Arrow / Feather (*.arrow *.feather);;All Files (*)", options=options)
         if not filePath:
             return
+        if selectedFilter.startswith("Gzip") and not filePath.endswith(".gz"):
+            filePath += ".gz"
+        elif selectedFilter.startswith("Zstandard") and not filePath.endswith(".zst"):
+            filePath += ".zst"
+        elif selectedFilter.startswith("Parquet") and not is_table_file(filePath):
+            filePath += ".parquet"
+        elif selectedFilter.startswith("Arrow") and not is_table_file(filePath):
+            filePath += ".arrow"
+
+        columns = None
+        if is_table_file(filePath) and not self.sheet.read_only:
+            names = column_names(self.sheet.headers, max(self.sheet.extent()[1], len(self.sheet.headers or ())))
+            dialog = ColumnsDialog("Export Columns", names, parent=self)
+            if dialog.exec_() != QDialog.Accepted:
+                return
+            columns = dialog.columns()
+        self.start_export(filePath, columns)
+
+    def start_export(self, filePath, columns=None):
+        if self.importThread is not None or self.exportThread is not None or self.cacheThread is not None \
+                or not self.view_idle():
+            return
+
+        self.exportProgress = QProgressDialog("Exporting CSV...", "Cancel", 0, 1000, self)
+        self.exportProgress.setWindowModality(Qt.WindowModal)
+        self.exportProgress.setMinimumDuration(500)
+
+        self.exportSpan = RECORDER.span('export', file=os.path.basename(filePath))
+        self.exportThread = QThread(self)
+        self.exportWorker = ExportWorker(self.sheet, filePath, columns)
+        self.exportWorker.moveToThread(self.exportThread)
+        self.exportThread.started.connect(self.exportWorker.run)
+        self.exportWorker.progress.connect(self.exportProgress.setValue)
+        self.exportWorker.failed.connect(self.export_failed)
+        self.exportWorker.finished.connect(self.export_finished)
+        self.exportProgress.canceled.connect(self.exportWorker.cancel, Qt.DirectConnection)
+        self.exportThread.start()
+        self.update_edit_triggers()
 
-        data = []
-        for row in range(self.tableWidget.rowCount()):
-            row_data = []
-            for col in range(self.tableWidget.columnCount()):
-                item = self.tableWidget.item(row, col)
-                row_data.append(item.text() if item else '')
-            data.append(row_data)
-
-        with open(filePath, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerows(data)
+    def export_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def export_finished(self):
+        self.exportThread.quit()
+        self.exportThread.wait()
+        self.exportProgress.reset()
+        self.exportThread = None
+        self.exportWorker = None
+        self.exportSpan.finish(rows=self.sheet.row_count, cells=self.sheet.row_count * self.sheet.column_count)
+        self.update_edit_triggers()
     
     
 
@@ -251,59 +1403,329 @@ class App(QMainWindow):
         stdDevAction.triggered.connect(self.calculate_std_dev)
         varianceAction = QAction("Variance", self)
         varianceAction.triggered.connect(self.calculate_variance)
+        summaryAction = QAction("Summary", self)
+        summaryAction.triggered.connect(self.show_summary)
+        groupAction = QAction("Group By / Pivot...", self)
+        groupAction.triggered.connect(self.show_group_by)
+        groupAction.setEnabled(self.editable())
         
         contextMenu.addAction(avgAction)
         contextMenu.addAction(sumAction)
         contextMenu.addAction(stdDevAction)
         contextMenu.addAction(varianceAction)
+        contextMenu.addSeparator()
+        contextMenu.addAction(summaryAction)
+        contextMenu.addAction(groupAction)
         
-        contextMenu.exec_(self.tableWidget.mapToGlobal(event.pos()))
+        contextMenu.exec_(self.tableView.mapToGlobal(event.pos()))
+
+    def selection_summary(self, name='summary'):
+        # All metrics for the selection at once, reused by every menu action
+        # until the selection or one of its columns changes. name labels the
+        # timing of the caller, e.g. calculate_sum.
+        ranges = self.selected_ranges()
+        span = RECORDER.span(name, cells=sum((bottom - top + 1) * (right - left + 1) for top, left, bottom, right in ranges))
+        model = self.tableView.model()
+        key = (id(self.sheet), id(model.row_order), tuple(ranges), tuple(self.sheet.versions(left, right) for _, left, _, right in ranges))
+        cached = self.summary_cache[0] == key
+        if not cached:
+            chunks = (chunk for top, left, bottom, right in ranges
+                      for chunk in self.sheet.numeric_chunks(model.row_selector(top, bottom), left, right))
+            self.summary_cache = (key, summarize(chunks))
+        span.finish(cached=cached)
+        return self.summary_cache[1]
+
+    def show_group_by(self):
+        if not self.editable():
+            return
+        names = column_names(self.sheet.headers, self.sheet.extent()[1])
+        if not names:
+            return QMessageBox.information(self, 'Group By / Pivot', 'There is no data to group.')
+        dialog = GroupByDialog(names, min(max(self.tableView.currentIndex().column(), 0), len(names) - 1), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        # The last result is reused until one of the columns it read changes
+        request = dialog.request()
+        keys, values, _, pivot = request
+        columns = set(keys) | set(values) | ({pivot} if pivot is not None else set())
+        key = (id(self.sheet), request, self.sheet.row_count, tuple(self.sheet.columns[col].version for col in sorted(columns)))
+        if self.group_cache[0] == key:
+            return self.show_grouping(self.group_cache[1])
+
+        self.statusBar().showMessage('Grouping...')
+        self.groupThread = QThread(self)
+        self.groupWorker = GroupWorker(self.sheet, key, request)
+        self.groupWorker.moveToThread(self.groupThread)
+        self.groupThread.started.connect(self.groupWorker.run)
+        self.groupWorker.grouped.connect(self.grouping_ready)
+        self.groupWorker.failed.connect(self.group_failed)
+        self.groupWorker.finished.connect(self.grouping_finished)
+        self.groupThread.start()
+        self.update_edit_triggers()
+
+    def grouping_ready(self, key, grouping):
+        self.group_cache = (key, grouping)
+        self.show_grouping(grouping)
+
+    def group_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def grouping_finished(self):
+        self.groupThread.quit()
+        self.groupThread.wait()
+        self.groupThread = None
+        self.groupWorker = None
+        self.statusBar().clearMessage()
+        self.update_edit_triggers()
+
+    def show_grouping(self, grouping):
+        # Opens the result as a sheet of its own in a new window
+        window = App()
+        window.import_sheet(to_sheet(grouping))
+        window.setWindowTitle(f"{self.title} - by {', '.join(grouping.headers[:len(grouping.keys)])}")
+        window.show()
+        self.result_windows = [w for w in self.result_windows if w.isVisible()] + [window]
+
+    def sort_by_column(self, col):
+        # Click sorts by a column and toggles its direction; Shift+click adds
+        # it as the next key or toggles it within the current keys
+        if self.sheet.read_only or self.sortThread is not None or self.groupThread is not None or self.importThread is not None \
+                or col >= self.sheet.column_count:
+            return
+        keys = list(self.model.sort_keys) if QApplication.keyboardModifiers() & Qt.ShiftModifier else \
+            [key for key in self.model.sort_keys if key[0] == col]
+        for i, (key_col, ascending) in enumerate(keys):
+            if key_col == col:
+                keys[i] = (col, not ascending)
+                break
+        else:
+            keys.append((col, True))
 
-    def get_selected_values(self):
-        values = []
-        for item in self.tableWidget.selectedItems():
+        self.statusBar().showMessage('Sorting...')
+        self.sortThread = QThread(self)
+        self.sortWorker = SortWorker(self.sheet, keys)
+        self.sortWorker.moveToThread(self.sortThread)
+        self.sortThread.started.connect(self.sortWorker.run)
+        self.sortWorker.sorted.connect(self.sort_ready)
+        self.sortWorker.failed.connect(self.sort_failed)
+        self.sortWorker.finished.connect(self.sort_finished)
+        self.sortThread.start()
+        self.update_edit_triggers()
+
+    def sort_ready(self, order, keys):
+        if self.sortWorker.sheet is not self.sheet:
+            return  # a followed file was rotated meanwhile: the order is for rows that are gone
+        self.model.sort_keys = keys
+        self.apply_view(order)
+        header = self.tableView.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(keys[0][0], Qt.AscendingOrder if keys[0][1] else Qt.DescendingOrder)
+
+    def sort_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
+
+    def sort_finished(self):
+        self.sortThread.quit()
+        self.sortThread.wait()
+        self.sortThread = None
+        self.sortWorker = None
+        self.statusBar().clearMessage()
+        self.update_edit_triggers()
+
+    def clear_sort(self):
+        self.model.sort_keys = []
+        self.apply_view(None)
+        self.tableView.horizontalHeader().setSortIndicatorShown(False)
+
+    def apply_view(self, order):
+        # Shows the sheet in `order` (None for file order) with the active filters applied
+        # A sort's order covers the rows there were when it started
+        row_base = len(order) if order is not None else None
+        if not self.model.filters:
+            return self.model.set_row_order(order, row_base=row_base)
+        mask = filter_mask(self.sheet, self.model.filters)
+        rows = np.flatnonzero(mask) if order is None else order[mask[order]]
+        self.model.set_row_order(rows, filtered=True, row_base=row_base)
+        self.statusBar().showMessage(f'{len(rows)} of {self.sheet.row_count} rows shown')
+
+    def show_filter(self):
+        if self.sheet.read_only or self.sortThread is not None:
+            return
+        dialog = FilterDialog(self.sheet.column_count, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.model.filters = self.model.filters + [dialog.filter()]
+        try:
+            self.apply_view(sort_order(self.sheet, self.model.sort_keys) if self.model.sort_keys else None)
+        except (ValueError, re.error) as e:
+            self.model.filters = self.model.filters[:-1]
+            QMessageBox.critical(self, "Error", str(e))
+
+    def show_formula(self):
+        if not self.editable():
+            return
+        # The current column if it is computed, else the first one to the right of the data
+        col = self.tableView.currentIndex().column()
+        dialog = FormulaDialog(self.model.formulas, col if col in self.model.formulas else self.sheet.extent()[1], self)
+        while dialog.exec_() == QDialog.Accepted:
+            col = dialog.column()
+            if col not in self.model.formulas and col < self.sheet.column_count and self.sheet.columns[col].last_filled() >= 0:
+                answer = QMessageBox.question(self, 'Computed Column', f'C{col + 1} holds data, which the formula replaces. Continue?')
+                if answer != QMessageBox.Yes:
+                    continue
             try:
-                val = float(item.text())
-                values.append(val)
-            except ValueError:
-                pass  # Ignore non-numeric values
-        return values
+                return self.model.set_formula(col, dialog.formulaEdit.text())
+            except ValueError as e:
+                QMessageBox.warning(self, 'Formula', str(e))
+
+    def remove_formula(self):
+        self.model.set_formula(self.tableView.currentIndex().column(), None)
+
+    def clear_filters(self):
+        self.model.filters = []
+        self.apply_view(sort_order(self.sheet, self.model.sort_keys) if self.model.sort_keys else None)
+        self.statusBar().clearMessage()
+
+    def show_find(self):
+        if self.sheet.read_only:
+            return
+        if getattr(self, 'findDialog', None) is None:
+            self.findDialog = FindDialog(self.sheet.column_count, self)
+            self.findDialog.findNext.connect(self.find_next)
+            self.findDialog.replaceAll.connect(self.replace_all)
+        # The sheet may have been replaced or widened since the dialog was made
+        self.findDialog.columnBox.setRange(0, max(self.sheet.column_count, 1))
+        self.findDialog.show()
+        self.findDialog.raise_()
+
+    def find_next(self, col, op, text):
+        # Jumps to the next match after the current cell in reading order,
+        # wrapping around; matches come from the cached column indexes
+        current = self.tableView.currentIndex()
+        start = (current.row(), current.column()) if current.isValid() else (-1, -1)
+        columns = [col] if col >= 0 else range(self.sheet.column_count)
+        try:
+            matches = [(c, self.model.view_position(matching_rows(self.sheet, c, op, text))) for c in columns]
+            # Rows hidden by a filter have no view position (-1)
+            matches = [(c, positions[positions >= 0]) for c, positions in matches]
+        except re.error as e:
+            return QMessageBox.critical(self, "Error", str(e))
+        for after in (start, (-1, -1)):
+            best = None
+            for c, positions in matches:
+                positions = positions[positions >= (after[0] if c > after[1] else after[0] + 1)]
+                if len(positions):
+                    hit = (int(positions.min()), c)
+                    best = hit if best is None or hit < best else best
+            if best is not None:
+                index = self.model.index(*best)
+                self.tableView.setCurrentIndex(index)
+                return self.tableView.scrollTo(index)
+        QMessageBox.information(self, 'Find', 'No matches found.')
+
+    def replace_all(self, col, op, text, replacement):
+        if not self.editable():
+            return
+        parts = []
+        try:
+            for c in ([col] if col >= 0 else range(self.sheet.column_count)):
+                rows = matching_rows(self.sheet, c, op, text)
+                if not len(rows) or (op != 'equals' and text == ''):
+                    continue
+                old = self.sheet.columns[c].take_at(rows)
+                new = replace_texts(old, op, text, replacement)
+                changed = np.flatnonzero(np.array(old, dtype=object) != np.array(new, dtype=object))
+                if len(changed):
+                    parts.append((rows[changed], c, [[new[i] for i in changed]]))
+        except re.error as e:
+            return QMessageBox.critical(self, "Error", str(e))
+        self.model.write_at('Replace', parts)
+        QMessageBox.information(self, 'Replace', f'Replaced {sum(len(p[0]) for p in parts)} cells.')
+
+    def update_selection_status(self):
+        ranges = self.selected_ranges()
+        self.selectionStatusTimer.stop()
+        if not ranges:
+            return self.selectionStatus.clear()
+        if self.sheet.read_only and self.large_file_status_rows < sum(
+                max(0, bottom - top + 1) for top, _, bottom, _ in (self.sheet.clamp(*r) for r in ranges)):
+            # A large file's rows are parsed from disk on the GUI thread, too
+            # slow to do on every selection; Summary still computes them
+            return self.selectionStatus.setText('Sum: n/a    Average: n/a    Count: n/a')
+        if self.sheet.read_only or self.model.row_order is not None or len(ranges) > 32:
+            self.selectionStatus.setText('Calculating...')
+            return self.selectionStatusTimer.start()
+        self.show_selection_status(*selection_totals(self.sheet, ranges))
+
+    def update_selection_status_full(self):
+        summary = self.selection_summary('selection_status')
+        if summary is None:
+            return self.show_selection_status(0.0, 0)
+        self.show_selection_status(summary.sum, summary.count)
+
+    def show_selection_status(self, total, count):
+        if not count:
+            return self.selectionStatus.setText('Count: 0')
+        self.selectionStatus.setText(f'Sum: {total:.2f}    Average: {total / count:.2f}    Count: {count}')
 
     def calculate_average(self):
-        values = self.get_selected_values()
-        if not values:
+        summary = self.selection_summary('calculate_average')
+        if summary is None:
             return QMessageBox.information(self, 'Average', 'No valid numbers selected.')
-        avg = sum(values) / len(values)
-        QMessageBox.information(self, 'Average', f'Average is: {avg:.2f}')
+        QMessageBox.information(self, 'Average', f'Average is: {summary.mean:.2f}')
 
     def calculate_sum(self):
-        values = self.get_selected_values()
-        if not values:
+        summary = self.selection_summary('calculate_sum')
+        if summary is None:
             return QMessageBox.information(self, 'Sum', 'No valid numbers selected.')
-        total = sum(values)
-        QMessageBox.information(self, 'Sum', f'Sum is: {total:.2f}')
+        QMessageBox.information(self, 'Sum', f'Sum is: {summary.sum:.2f}')
 
     def calculate_std_dev(self):
-        values = self.get_selected_values()
-        if not values:
+        summary = self.selection_summary('calculate_std_dev')
+        if summary is None:
             return QMessageBox.information(self, 'Standard Deviation', 'No valid numbers selected.')
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / len(values)
-        std_dev = variance ** 0.5
-        QMessageBox.information(self, 'Standard Deviation', f'Standard Deviation is: {std_dev:.2f}')
+        QMessageBox.information(self, 'Standard Deviation', f'Standard Deviation is: {summary.std:.2f}')
 
     def calculate_variance(self):
-        values = self.get_selected_values()
-        if not values:
+        summary = self.selection_summary('calculate_variance')
+        if summary is None:
             return QMessageBox.information(self, 'Variance', 'No valid numbers selected.')
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / len(values)
-        QMessageBox.information(self, 'Variance', f'Variance is: {variance:.2f}')
+        QMessageBox.information(self, 'Variance', f'Variance is: {summary.variance:.2f}')
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    def show_summary(self):
+        summary = self.selection_summary()
+        if summary is None:
+            return QMessageBox.information(self, 'Summary', 'No valid numbers selected.')
+        QMessageBox.information(self, 'Summary', format_summary(summary))
+
+def profile_startup(app):
+    # Cold start broken down into imports, widget construction and the first
+    # pass of the event loop, printed once the window has been shown
+    created = time.perf_counter()
     ex = App()
+    built = time.perf_counter()
     ex.show()
+
+    def report():
+        shown = time.perf_counter()
+        print(f'imports          {1000 * (IMPORTED - STARTED):8.1f} ms', file=sys.stderr)
+        print(f'QApplication     {1000 * (created - IMPORTED):8.1f} ms', file=sys.stderr)
+        print(f'widgets          {1000 * (built - created):8.1f} ms', file=sys.stderr)
+        print(f'first show       {1000 * (shown - built):8.1f} ms', file=sys.stderr)
+        print(f'total            {1000 * (shown - STARTED):8.1f} ms', file=sys.stderr)
+        for name in ('numpy', 'pandas'):
+            print(f"{name:16} {'loaded' if is_loaded(name) else 'deferred'}", file=sys.stderr)
+        app.quit()
+    QTimer.singleShot(0, report)
+    return ex
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    if '--profile-startup' in sys.argv[1:]:
+        ex = profile_startup(app)
+    else:
+        ex = App()
+        ex.show()
     sys.exit(app.exec_())
 
 